@@ -2,4 +2,5 @@
 from .config_interface import Config
 config = Config() #This needs to follow the previous line to expose config to others
 
-from .apis import Scopus
\ No newline at end of file
+from .apis import Scopus
+from .async_apis import AsyncScopus
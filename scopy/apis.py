@@ -11,17 +11,23 @@ http://dev.elsevier.com/interactive.html
     credentials for the request to work.
  * Scopus.search uses OpenSearch and returns a few OpenSearch response elements
     in the response JSON, including totalResults, startIndex, and itemsPerPage.
-    Look into increasing number of items per page so we get back a larger response.
-
---- TODOs ---
- * Look into increasing number of items per page in Scopus search.
+    The page size is set with the 'count' parameter (at most 200 for the
+    standard view and 25 for the complete view). Scopus.iter_search follows
+    the pages automatically.
 """
 
 # Standard imports
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from email.utils import parsedate_to_datetime
 from urllib.parse import quote
 
 # Third-party imports
 import requests
+from requests.adapters import HTTPAdapter
 
 # Local imports
 from . import models
@@ -30,22 +36,318 @@ from scopy.scopy_errors import *
 from pypub.paper_info import PaperInfo
 from pypub.pypub_errors import *
 import scopy.utils as utils
+from .batch import BatchRetrievalMixin, iter_batch
+from .cache import make_key as make_cache_key
+from .cache import MemoryLRU
+from .throttle import RateLimiter
+from .retry import RetryPolicy
+from . import resolve
+from . import streaming
+from .metrics import Metrics, format_prometheus
+from .search_builder import compile_query
+
+
+# Abstract retrieval views, each one contains everything in the previous ones.
+# The REF view is not included as it returns the references in a different
+# format from the FULL view.
+ABSTRACT_VIEWS = ('META', 'META_ABS', 'FULL')
+
+# The smallest view that contains each attribute of the models
+ATTRIBUTE_VIEWS = {
+    'doi': 'META',
+    'eid': 'META',
+    'pii': 'META',
+    'pubmed_id': 'META',
+    'title': 'META',
+    'publication': 'META',
+    'type': 'META',
+    'issn': 'META',
+    'volume': 'META',
+    'issue': 'META',
+    'pages': 'META',
+    'date': 'META',
+    'authors': 'META',
+    'link': 'META',
+    'abstract': 'META_ABS',
+    'references': 'FULL'}
+
+
+def view_for_attributes(attributes):
+    """
+    Returns the smallest abstract retrieval view containing all of the
+    given attributes.
+
+    Examples
+    --------
+    view_for_attributes(['doi', 'abstract']) => 'META_ABS'
+    """
+    index = 0
+    for name in attributes:
+        try:
+            view = ATTRIBUTE_VIEWS[name]
+        except KeyError:
+            raise ValueError('Unrecognized attribute: %s' % name)
+        index = max(index, ABSTRACT_VIEWS.index(view))
+    return ABSTRACT_VIEWS[index]
+
+
+def _larger_views(view):
+    if view not in ABSTRACT_VIEWS:
+        return ()
+    return ABSTRACT_VIEWS[ABSTRACT_VIEWS.index(view) + 1:]
+
+
+def _get_model_classes(compact_models, keep_json):
+    """
+    Returns
+    -------
+    (entry_class, ref_class)
+    """
+    if compact_models:
+        return (partial(models.CompactScopusEntry, keep_json=keep_json),
+                partial(models.CompactScopusRef, keep_json=keep_json))
+    else:
+        return models.ScopusEntry, models.ScopusRef
+
+
+def _abstract_url(base_url, input_type, input_id):
+    if input_id is None:
+        raise LookupError('Need to enter a URL or DOI')
+    return base_url + '/abstract/' + input_type + '/' + input_id
+
+
+def _article_url(base_url, input_type, input_id):
+    # Make sure input_id is a string
+    if isinstance(input_id, int):
+        input_id = str(input_id)
+    return base_url + '/article/' + input_type + '/' + quote(input_id)
+
+
+def _search_params(search_string, view, date_range, start, count, cursor=None):
+    params = dict()
+
+    # Mandatory params
+    params['query'] = compile_query(search_string)
+    params['view'] = view
+    if date_range is not None:
+        params['date'] = date_range
+    if start is not None:
+        params['start'] = start
+    if count is not None:
+        params['count'] = count
+    if cursor is not None:
+        params['cursor'] = cursor
+    return params
+
+
+def _get_retry_after(headers):
+    """
+    Returns the number of seconds the server asked us to wait, based on
+    the Retry-After or X-RateLimit-Reset headers, or None.
+    """
+    retry_after = headers.get('Retry-After')
+    if retry_after is not None:
+        try:
+            return max(0, float(retry_after))
+        except ValueError:
+            try:
+                date = parsedate_to_datetime(retry_after)
+            except (TypeError, ValueError):
+                date = None
+            if date is not None:
+                return max(0, date.timestamp() - time.time())
+
+    # The reset time is for the weekly quota, it is only relevant if that
+    # is what has run out
+    reset = headers.get('X-RateLimit-Reset')
+    if reset is not None and headers.get('X-RateLimit-Remaining') == '0':
+        try:
+            return max(0, float(reset) - time.time())
+        except ValueError:
+            pass
+
+    return None
+
+
+def _raise_rate_limit_error(rate_limiter, endpoint, headers):
+    retry_after = _get_retry_after(headers)
+    if retry_after is not None:
+        rate_limiter.block(endpoint, retry_after)
+    raise RateLimitError('Scopus rate limit exceeded for %s requests' % endpoint,
+                         retry_after=retry_after)
+
+
+# The status checks are shared with the asyncio client. They are only called
+# for non-OK responses and always raise.
+
+def _check_abstract_status(status_code):
+    #Removed last bits of the IP
+    #401 - '{"service-error":{"status":{"statusCode":"AUTHENTICATION_ERROR","statusText":"Client IP Address: 24.211.***.*** does not resolve to an account"}}}'
+    if status_code == 401:
+        raise ConnectionRefusedError('Client IP Address does not resolve to an account')
+    if status_code == 404:
+        raise LookupError('Could not find DOI on Scopus.')
+    raise ConnectionError('Failed to connect to Scopus with status code %d' % status_code)
+
+
+def _check_search_status(status_code, text):
+    if status_code == 401:
+        raise ConnectionRefusedError('Client IP Address does not resolve to an account')
+    raise ConnectionError('Failed to connect to Scopus with status code %d: %s' % (status_code, text))
+
+
+def _check_article_status(status_code):
+    if status_code in (401, 403):
+        raise ConnectionRefusedError('Client IP Address does not resolve to an account')
+    if status_code == 400:
+        raise AuthenticationError('Full article access limited by Scopus. May be available elsewhere.')
+    raise ConnectionError('Failed to connect to Scopus with status code %d' % status_code)
+
+
+# file_type => mime type requested from the article retrieval API
+ARTICLE_FORMATS = {
+    'xml': 'text/xml',
+    'pdf': 'application/pdf',
+    'json': 'application/json'}
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def _safe_filename(input_id):
+    # DOIs contain '/' amongst other things
+    return re.sub(r'[^\w.-]+', '_', str(input_id))
+
+
+# Largest 'count' the search API allows for each view
+MAX_SEARCH_PAGE_SIZE = {'standard': 200, 'complete': 25}
+
+# Offset based paging is limited to this many results per search
+MAX_OFFSET_RESULTS = 5000
 
 
 class Scopus(object):
     """
     Attributes
     ----------
-    
+    session : requests.Session
+        Shared by all requests made by this instance and its retrieval
+        classes so that connections to the server are pooled and reused.
+    timeout : float or (float, float)
+        Passed to requests as the (connect, read) timeout in seconds.
+    cache : scopy.cache.ResponseCache
+        If not None, abstract retrieval responses are stored here and
+        reused. Set to None to bypass the cache.
+    abstract_view : str
+        If not None, abstract requests without a field list use at least
+        this view, see __init__
+    memo : scopy.cache.MemoryLRU
+        Parsed abstract retrieval responses, shared by the retrieval
+        classes. None if disabled.
+    rate_limiter : scopy.throttle.RateLimiter
+        Paces requests to each endpoint, shared by all threads using this
+        instance.
+    retry_policy : scopy.retry.RetryPolicy
+        Determines which failed requests are retried and how long to wait
+        before doing so.
+    retry_counts : collections.Counter
+        Number of retries made for each endpoint, the same as
+        metrics.retries
+    metrics : scopy.metrics.Metrics
+        Latency, status codes, sizes, decode and model construction times
+        of all requests, see stats
+    json_loads : callable
+        Decodes the JSON body of every response, including cached ones.
+    entry_class : callable
+        Creates an entry object from JSON, models.ScopusEntry by default
+    ref_class : callable
+        Creates a reference object from JSON, models.ScopusRef by default
     """
     
     base_url = 'http://api.elsevier.com/content'
     
-    def __init__(self):
+    def __init__(self, pool_size=10, timeout=(5, 30), keep_alive=True, cache=None,
+                 memo_max_entries=128, memo_max_bytes=None, rate_limits=None,
+                 retry_policy=None, json_decoder=None, compact_models=False, keep_json=True,
+                 abstract_view=None, spread_quota=False):
+        """
+        Parameters
+        ----------
+        pool_size : int
+            Maximum number of connections kept open to the server. This
+            should be at least as large as the number of threads making
+            requests with this instance.
+        timeout : float or (float, float)
+            Connect and read timeout in seconds, see requests.get
+        keep_alive : bool
+            If False, connections are closed after each request.
+        cache : scopy.cache.ResponseCache
+            e.g. scopy.cache.SQLiteCache
+        memo_max_entries : int
+            Number of parsed abstract retrieval responses kept in memory.
+            Use 0 to disable.
+        memo_max_bytes : int
+            Limit on the total size (in response bytes) of the parsed
+            responses kept in memory.
+        rate_limits : dict
+            Maximum requests per second for 'search', 'abstract' and
+            'article' requests. See scopy.throttle.DEFAULT_RATES
+        spread_quota : bool
+            If True, requests are also slowed down so that the remaining
+            quota reported by the server (X-RateLimit-Remaining) lasts
+            until it resets (X-RateLimit-Reset). See
+            scopy.throttle.RateLimiter
+        retry_policy : scopy.retry.RetryPolicy
+            Defaults to RetryPolicy(). Use RetryPolicy(max_attempts=1) to
+            disable retries. Its max_retry_after is also the longest the
+            rate limiter will hold a request, longer waits (e.g. for the
+            weekly quota to reset) raise RateLimitError.
+        json_decoder : str or callable
+            {'orjson', 'ujson', 'json'} or a function. By default the
+            fastest installed decoder is used, see
+            scopy.utils.get_json_decoder
+        compact_models : bool
+            If True, entries and references are returned as
+            models.CompactScopusEntry and models.CompactScopusRef, which
+            use much less memory than the default models.
+        keep_json : bool
+            Only used with compact_models. If False the raw JSON is not
+            kept on the objects after parsing.
+        abstract_view : str
+            {None, 'META', 'META_ABS', 'FULL'}
+            Each retrieval class requests the smallest view it needs (e.g.
+            META_ABS for entry_retrieval, FULL for get_all_data). A cached
+            response (memo or cache) is reused for the same or any smaller
+            view, and once a document has been fetched with one view any
+            other view of it is fetched as FULL. Still, retrieving an entry
+            and then all data for a document takes two requests. Use 'FULL'
+            to always request (at least) this view, so that every retrieval
+            class shares a single response per document.
+        """
 
         # Authentication
         self.key = config.api_key
 
+        self.timeout = timeout
+        self.json_loads = utils.get_json_decoder(json_decoder)
+        self.entry_class, self.ref_class = _get_model_classes(compact_models, keep_json)
+        self.pool_size = pool_size
+        self.cache = cache
+        if abstract_view is not None and abstract_view not in ABSTRACT_VIEWS:
+            raise ValueError('Unrecognized abstract_view: %s' % abstract_view)
+        self.abstract_view = abstract_view
+        if memo_max_entries:
+            self.memo = MemoryLRU(memo_max_entries, memo_max_bytes)
+        else:
+            self.memo = None
+        self.session = self._create_session(pool_size, keep_alive)
+        if retry_policy is None:
+            retry_policy = RetryPolicy()
+        self.retry_policy = retry_policy
+        # Waits the retry policy wouldn't accept raise rather than sleep
+        self.rate_limiter = RateLimiter(rate_limits, spread_quota=spread_quota,
+                                        max_block=retry_policy.max_retry_after)
+        self.metrics = Metrics()
+
         self.abstract_retrieval = AbstractRetrieval(self)
         self.article_retrieval = ArticleRetrieval(self)
 
@@ -56,6 +358,154 @@ class Scopus(object):
         self.entry_retrieval = EntryRetrieval(self)
         self.get_all_data = GetAllData(self)
 
+    def _create_session(self, pool_size, keep_alive):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def close(self):
+        """
+        Closes all pooled connections.
+        """
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _send_get_request(self, endpoint, url, headers=None, params=None, stream=False):
+        """
+        All http requests to Scopus go through this method so that they
+        share the session's connection pool, rate limits and retry policy.
+
+        Parameters
+        ----------
+        endpoint : str
+            {'search', 'abstract', 'article'}
+        stream : bool
+            If True the body isn't read, the caller must read it from
+            resp.raw (or resp.iter_content) and close the response.
+        """
+        if headers is None:
+            headers = self._get_default_headers()
+
+        policy = self.retry_policy
+        attempt = 0
+        while True:
+            attempt += 1
+            self.rate_limiter.acquire(endpoint)
+            start_time = time.perf_counter()
+            try:
+                resp = self.session.get(url, headers=headers, params=params, timeout=self.timeout,
+                                        stream=stream)
+            except Exception as exc:
+                self.metrics.observe_request(endpoint, time.perf_counter() - start_time, error=exc)
+                if not isinstance(exc, policy.retry_exceptions) or not policy.should_retry(attempt):
+                    raise
+                self._record_retry(endpoint)
+                time.sleep(policy.get_delay(attempt))
+                continue
+
+            self.metrics.observe_request(endpoint, time.perf_counter() - start_time,
+                                         resp.status_code, _response_size(resp, stream))
+            self.rate_limiter.update_from_headers(endpoint, resp.headers)
+
+            if resp.ok:
+                return resp
+
+            retry_after = _get_retry_after(resp.headers)
+            if policy.should_retry(attempt, resp.status_code, retry_after):
+                # Returns the connection to the pool when streaming
+                resp.close()
+                self._record_retry(endpoint)
+                if resp.status_code == 429 and retry_after is not None:
+                    self.rate_limiter.block(endpoint, retry_after)
+                time.sleep(policy.get_delay(attempt, retry_after))
+                continue
+
+            if resp.status_code == 429:
+                _raise_rate_limit_error(self.rate_limiter, endpoint, resp.headers)
+
+            return resp
+
+    @property
+    def retry_counts(self):
+        return self.metrics.retries
+
+    def _record_retry(self, endpoint):
+        self.metrics.record_retry(endpoint)
+
+    def _decode(self, endpoint, body):
+        start_time = time.perf_counter()
+        value = self.json_loads(body)
+        self.metrics.observe_decode(endpoint, time.perf_counter() - start_time)
+        return value
+
+    def _build_model(self, name, function, *args):
+        start_time = time.perf_counter()
+        value = function(*args)
+        self.metrics.observe_model(name, time.perf_counter() - start_time)
+        return value
+
+    def stats(self):
+        """
+        Returns a snapshot of the request metrics.
+
+        Returns
+        -------
+        dict
+            'requests' : endpoint => dict with
+                'latency' : histogram, see metrics.Histogram.snapshot
+                'status_codes' : status code => count
+                'errors' : exception name => count
+                'bytes' : int
+                'retries' : int
+            'decode' : endpoint => histogram of JSON decode times
+            'models' : model name => histogram of object construction times
+            'cache' : {'memo', 'disk'} => {'hits', 'misses'}, for the
+                caches that are enabled
+
+        See Also
+        --------
+        prometheus_metrics
+        """
+        stats = self.metrics.snapshot()
+        caches = {}
+        if self.memo is not None:
+            caches['memo'] = {'hits': self.memo.hits, 'misses': self.memo.misses}
+        if self.cache is not None:
+            caches['disk'] = {'hits': self.cache.hits, 'misses': self.cache.misses}
+        stats['cache'] = caches
+        return stats
+
+    def prometheus_metrics(self, prefix='scopy'):
+        """
+        Returns the stats in the Prometheus text format, e.g. to serve from
+        a /metrics endpoint.
+        """
+        return format_prometheus(self.stats(), prefix=prefix)
+
+    def quota(self, endpoint='abstract'):
+        """
+        Returns the API key quota last reported by the server.
+
+        Parameters
+        ----------
+        endpoint : str
+            {'search', 'abstract', 'article'}
+
+        Returns
+        -------
+        scopy.throttle.Quota or None
+        """
+        return self.rate_limiter.quota(endpoint)
+
     def _get_default_headers(self):
         header = dict()
         header['Accept'] = 'application/json'
@@ -63,7 +513,8 @@ class Scopus(object):
 
         return header
 
-    def make_abstract_get_request(self, url=None, input_id=None, input_type=None):
+    def make_abstract_get_request(self, url=None, input_id=None, input_type=None,
+                                  view='FULL', field=None, use_cache=True, refresh=False):
         """
 
         Parameters
@@ -71,41 +522,152 @@ class Scopus(object):
         url : str
             Target URL of the API request. This is not none
             when searching by some other means besides a DOI lookup.
-        doi : str
-            DOI of target paper.
+        input_id : str
+            Id of the target paper, e.g. a DOI
+        input_type : str
+            {'doi', 'eid', 'pii', 'pubmed_id'}
+        view : str
+            {'META', 'META_ABS', 'FULL', 'REF'}
+            Smaller views are quicker to download and parse, see
+            ATTRIBUTE_VIEWS and view_for_attributes
+            http://api.elsevier.com/documentation/retrieval/AbstractRetrievalViews.htm
+            Without a field list, a larger view may be returned, see the
+            abstract_view parameter of Scopus.
+        field : str or list
+            If not None, only these fields are returned, e.g. ['dc:description']
+        use_cache : bool
+            If False the caches (memo and cache) are neither read nor
+            updated.
+        refresh : bool
+            If True the caches are not read but are updated with the new
+            response.
 
         Returns
         -------
-
+        dict
+            The 'abstracts-retrieval-response' section of the response.
+            When the memo is enabled this is shared between callers and
+            should not be modified.
         """
         if url is None:
-            if input_id is None:
-                raise LookupError('Need to enter a URL or DOI')
-            url = self.base_url + '/abstract/' + input_type + '/' + input_id
+            url = _abstract_url(self.base_url, input_type, input_id)
+            key_type, key_id = input_type, input_id
+        else:
+            key_type, key_id = 'url', url
 
-        header = self._get_default_headers()
-        
-        #http://api.elsevier.com/documentation/retrieval/AbstractRetrievalViews.htm
-        params = {'view' : 'FULL'}
+        cache = self.cache if use_cache else None
+        memo = self.memo if use_cache else None
 
-        resp = requests.get(url, headers=header, params=params)
+        if field is not None:
+            if not isinstance(field, str):
+                field = ','.join(field)
+            cache_view = view + '|' + field
+        else:
+            view, value = self._get_shared_view(view, key_type, key_id, memo, cache, refresh)
+            if value is not None:
+                return value
+            cache_view = view
+        cache_key = make_cache_key('abstract', key_type, key_id, cache_view)
 
-        #Removed last bits of the IP
-        #401 - '{"service-error":{"status":{"statusCode":"AUTHENTICATION_ERROR","statusText":"Client IP Address: 24.211.***.*** does not resolve to an account"}}}'
+        def load():
+            body = None
+            if cache is not None and not refresh:
+                body = cache.get(cache_key)
 
-        if not resp.ok:
-            if resp.status_code == 401:
-                raise ConnectionRefusedError('Client IP Address does not resolve to an account')
-            if resp.status_code == 404:
-                raise LookupError('Could not find DOI on Scopus.')
-            raise ConnectionError('Failed to connect to Scopus with status code %d' % resp.status_code)
+            if body is None:
+                header = self._get_default_headers()
+
+                params = {'view' : view}
+                if field is not None:
+                    params['field'] = field
+
+                resp = self._send_get_request('abstract', url, headers=header, params=params)
+
+                if not resp.ok:
+                    _check_abstract_status(resp.status_code)
+
+                body = resp.content
+                if cache is not None:
+                    cache.set(cache_key, body)
+
+            resp_json = self._decode('abstract', body)
+            retrieval_resp = resp_json.get('abstracts-retrieval-response')
+
+            return retrieval_resp, len(body)
 
-        resp_json = resp.json()
-        retrieval_resp = resp_json.get('abstracts-retrieval-response')
+        if memo is not None:
+            return memo.get_or_load(cache_key, load, refresh=refresh)
+        return load()[0]
+
+    def _get_shared_view(self, view, key_type, key_id, memo, cache, refresh):
+        """
+        Returns (view to load, None), or (None, value) if a larger view is
+        already in memory. See the abstract_view parameter of __init__.
+        """
+        if view not in ABSTRACT_VIEWS:
+            return view, None
+
+        if self.abstract_view is not None and \
+                ABSTRACT_VIEWS.index(self.abstract_view) > ABSTRACT_VIEWS.index(view):
+            view = self.abstract_view
+        if refresh:
+            return view, None
+
+        def get_key(other_view):
+            return make_cache_key('abstract', key_type, key_id, other_view)
+
+        # A response for a larger view can be used instead
+        for larger_view in _larger_views(view):
+            if memo is not None:
+                value = memo.get(get_key(larger_view))
+                if value is not None:
+                    return None, value
+            if cache is not None and get_key(larger_view) in cache:
+                return larger_view, None
+
+        if view == 'FULL' or (memo is not None and get_key(view) in memo) or \
+                (cache is not None and get_key(view) in cache):
+            return view, None
+
+        # The document has been fetched with a smaller view for something
+        # else, fetching FULL now means any further view is served from it
+        for smaller_view in ABSTRACT_VIEWS[:ABSTRACT_VIEWS.index(view)]:
+            key = get_key(smaller_view)
+            if (memo is not None and key in memo) or (cache is not None and key in cache):
+                return 'FULL', None
+        return view, None
+
+    def stream_abstract_get_request(self, url=None, input_id=None, input_type=None,
+                                    view='FULL', field=None):
+        """
+        Like make_abstract_get_request, but returns the response without
+        reading its body so that it can be parsed incrementally. The cache
+        and memo are not used.
+
+        Returns
+        -------
+        requests.Response
+            The caller should close the response, e.g. with a with block
+        """
+        if url is None:
+            url = _abstract_url(self.base_url, input_type, input_id)
+
+        params = {'view': view}
+        if field is not None:
+            params['field'] = field if isinstance(field, str) else ','.join(field)
+
+        resp = self._send_get_request('abstract', url, headers=self._get_default_headers(),
+                                      params=params, stream=True)
+        if not resp.ok:
+            resp.close()
+            _check_abstract_status(resp.status_code)
 
-        return retrieval_resp
+        # Let urllib3 undo any gzip encoding while reading resp.raw
+        resp.raw.decode_content = True
+        return resp
 
-    def search(self, search_string, view = 'standard', date_range=None):
+    def search(self, search_string, view = 'standard', date_range=None, start=None, count=None,
+               cursor=None):
         '''
 
         Documentation of function at:
@@ -113,8 +675,9 @@ class Scopus(object):
 
         Parameters
         ----------
-        search_string : str
-            The search term.
+        search_string : str or search_builder.Query
+            The search term. Queries built with scopy.search_builder are
+            compiled to the Scopus syntax.
         date_range : str
             Range of dates to search over.
         view : str
@@ -123,58 +686,212 @@ class Scopus(object):
             The standard is currently the default as this doesn't return
             all of the possible information on a paper anyway, so let's make
             the request slightly quicker
+        start : int
+            Offset of the first result to return (0 based).
+        count : int
+            Number of results to return. The server default is 25. The
+            maximum is 200 for the standard view and 25 for the complete view.
+        cursor : str
+            Use '*' to start cursor based paging, and then the next_cursor
+            of the previous page. Unlike start, cursors are not limited to
+            the first few thousand results. Can't be combined with start.
 
         Returns
         -------
+        models.SearchResults
 
+        See Also
+        --------
+        iter_search
         '''
         '''
-        Problem: limited to only 25 results per page. Sending an opensearch
-        itemsPerPage request in the params as a Query object doesn't seem
-        to increase the number of items per page that is returned.
+        Sending an opensearch itemsPerPage request in the params as a Query
+        object doesn't increase the number of items per page that is
+        returned, the 'count' parameter needs to be used instead.
         '''
         # Build target URL for get request
         url = self.base_url + '/search/scopus'
 
-        # Build request headers
-        header = dict()
-        header['Accept'] = 'application/json'
-        header['X-ELS-APIKey'] = self.key
+        header = self._get_default_headers()
+        params = _search_params(search_string, view, date_range, start, count, cursor)
 
-        # Attempts to increase items per page by using opensearch formatting.
-        # Not working so far.
-        #query_dict = dict()
+        resp = self._send_get_request('search', url, headers=header, params=params)
         
-        #JAH: Where are these coming from? Why do we want to
-        #increase the # of results per page?
-        #query_dict['@searchTerms'] = search_string
-        #query_dict['@itemsPerPage'] = 50
+        if not resp.ok:
+            _check_search_status(resp.status_code, resp.text)
+           
+        search_results = self._decode('search', resp.content)['search-results']
+        return self._build_model('search_results', models.SearchResults, search_results)
 
-        params = dict()
-        #params['opensearch:Query'] = query_dict
+    def count(self, search_string, date_range=None):
+        '''
+        Returns the number of results of a search, requesting only a single
+        result.
 
-        # Mandatory params
-        params['query'] = search_string
-        params['view'] = view
-        if date_range is not None:
-            params['date'] = date_range
+        Parameters
+        ----------
+        search_string : str or search_builder.Query
+        date_range : str
 
-        resp = requests.get(url, headers=header, params=params)
-        
-        if not resp.ok:
-            if resp.status_code == 401:
-                raise ConnectionRefusedError('Client IP Address does not resolve to an account')
-            print(resp.text)
-            print(resp.status_code)
-            raise ConnectionError('Failed to connect to Scopus')
-           
-        return models.SearchResults(resp.json()['search-results'])
-        
-        #entry_list = results['entry']
+        Returns
+        -------
+        int
+
+        See Also
+        --------
+        scopy.planner.plan_harvest
+        '''
+        return int(self.search(search_string, date_range=date_range, count=1).total_results)
+
+    def resolve_ids(self, ids, id_type='doi', max_workers=None):
+        '''
+        Looks up many ids with few requests by combining them into OR'd
+        search queries, e.g. DOI(a) OR DOI(b) OR ...
+
+        The queries are kept under the query length limit and are run
+        concurrently.
+
+        Parameters
+        ----------
+        ids : iterable
+        id_type : str
+            {'doi', 'eid', 'pii', 'pubmed'}
+        max_workers : int
+            Number of queries run at once, defaults to pool_size
+
+        Returns
+        -------
+        (found, missing)
+            found : dict, id => models.SearchResultEntry
+            missing : list of the ids that were not found
+
+        Examples
+        --------
+        found, missing = api.resolve_ids(dois, id_type='doi')
+        eids = {doi: entry.eid for doi, entry in found.items()}
+        '''
+        return resolve.resolve_ids(self, ids, id_type=id_type, max_workers=max_workers)
+
+    def iter_search(self, search_string, max_results=None, view='standard',
+                    date_range=None, page_size=None, prefetch=True, use_cursor=None):
+        '''
+        Iterates over all results of a search, requesting pages as needed.
+
+        Parameters
+        ----------
+        search_string : str or search_builder.Query
+            The search term, see Scopus.search
+        max_results : int
+            Stop after this many results. By default all results are returned.
+        view : str
+            See Scopus.search
+        date_range : str
+            See Scopus.search
+        page_size : int
+            Number of results per request. Defaults to the largest size
+            allowed for the view.
+        prefetch : bool
+            If True, the next page is requested in a background thread while
+            the entries of the current page are being consumed.
+        use_cursor : bool
+            If True, pages are followed using cursors rather than offsets.
+            Offset paging is limited by the server to the first
+            MAX_OFFSET_RESULTS results, cursor paging can return every
+            result. By default cursors are used only for searches with
+            more results than that (the first page is then requested
+            again). If False, ValueError is raised for these searches.
+
+        Yields
+        ------
+        models.SearchResultEntry
+
+        Examples
+        --------
+        for entry in api.iter_search('TITLE(neuromodulation)', max_results=1000):
+            print(entry.eid)
+        '''
+        cursor = '*' if use_cursor else None
+        for page in self._iter_search_pages(search_string, max_results=max_results, view=view,
+                                            date_range=date_range, page_size=page_size,
+                                            prefetch=prefetch, cursor=cursor,
+                                            switch_to_cursor=use_cursor is None):
+            for entry in page.entries:
+                yield entry
+
+    def _iter_search_pages(self, search_string, max_results=None, view='standard',
+                           date_range=None, page_size=None, prefetch=True, start=0,
+                           cursor=None, switch_to_cursor=True):
+        '''
+        Yields models.SearchResults pages, trimmed so that no more than
+        max_results entries are returned in total.
+
+        If cursor is not None pages are followed with cursors starting from
+        that cursor ('*' for the first page). start is then the number of
+        results already returned before that cursor, which is only used to
+        know when to stop.
+
+        If offset paging would go past MAX_OFFSET_RESULTS, cursor paging
+        is used instead when switch_to_cursor is True and start is 0, and
+        ValueError is raised otherwise.
+        '''
+        if page_size is None:
+            page_size = MAX_SEARCH_PAGE_SIZE[view]
+
+        def get_page(page_start, page_cursor):
+            if page_cursor is None:
+                return self.search(search_string, view=view, date_range=date_range,
+                                   start=page_start, count=page_size)
+            else:
+                return self.search(search_string, view=view, date_range=date_range,
+                                   count=page_size, cursor=page_cursor)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            page = get_page(start, cursor)
+            total = int(page.total_results)
+            if max_results is not None:
+                total = min(total, start + max_results)
+
+            if cursor is None and total > MAX_OFFSET_RESULTS:
+                if not switch_to_cursor or start:
+                    raise ValueError('The search has %d results but offset paging is limited to '
+                                     'the first %d, use cursor paging instead'
+                                     % (total, MAX_OFFSET_RESULTS))
+                # Cursor paging has to start from the first page
+                cursor = '*'
+                page = get_page(start, cursor)
+
+            while True:
+                n_entries = len(page.entries)
+                if n_entries == 0 or start >= total:
+                    return
+
+                next_start = start + n_entries
+                if cursor is not None:
+                    next_cursor = page.next_cursor
+                    if next_cursor is None or next_cursor == cursor:
+                        total = min(total, next_start)
+                    cursor = next_cursor
+
+                next_page = None
+                if prefetch and next_start < total:
+                    next_page = executor.submit(get_page, next_start, cursor)
+
+                if start + n_entries > total:
+                    page.entries = page.entries[:total - start]
+                yield page
+
+                if next_start >= total:
+                    return
 
+                start = next_start
+                if next_page is None:
+                    page = get_page(start, cursor)
+                else:
+                    page = next_page.result()
 
 
-class AbstractRetrieval(object):
+
+class AbstractRetrieval(BatchRetrievalMixin):
 
     """
     http://api.elsevier.com/documentation/AbstractRetrievalAPI.wadl
@@ -187,27 +904,37 @@ class AbstractRetrieval(object):
     Does not return full text of article, see Article() class for that.
     This could be a catch-all get request to extract bibliography, etc.
     '''
+
+    # Only the abstract is needed
+    view = view_for_attributes(['abstract'])
+    field = None
+
     def __init__(self, parent):
         self.parent = parent
 
     def get_from_eid(self,eid):
-        retrieval_resp = self.parent.make_abstract_get_request(input_type='eid', input_id=eid)
-        return self._abstract_from_json(retrieval_resp)
+        retrieval_resp = self.parent.make_abstract_get_request(input_type='eid', input_id=eid,
+                                                               view=self.view, field=self.field)
+        return self.parent._build_model('abstract', self._abstract_from_json, retrieval_resp)
 
     def get_from_doi(self, doi):
-        retrieval_resp = self.parent.make_abstract_get_request(input_type='doi', input_id=doi)
-        return self._abstract_from_json(retrieval_resp)
+        retrieval_resp = self.parent.make_abstract_get_request(input_type='doi', input_id=doi,
+                                                               view=self.view, field=self.field)
+        return self.parent._build_model('abstract', self._abstract_from_json, retrieval_resp)
 
     def get_from_pii(self, pii):
-        retrieval_resp = self.parent.make_abstract_get_request(input_type='pii', input_id=pii)
-        return self._abstract_from_json(retrieval_resp)
+        retrieval_resp = self.parent.make_abstract_get_request(input_type='pii', input_id=pii,
+                                                               view=self.view, field=self.field)
+        return self.parent._build_model('abstract', self._abstract_from_json, retrieval_resp)
 
     def get_from_pubmed(self, pubmed_id):
-        retrieval_resp = self.parent.make_abstract_get_request(input_type='pubmed_id', input_id=pubmed_id)
-        return self._abstract_from_json(retrieval_resp)
+        retrieval_resp = self.parent.make_abstract_get_request(input_type='pubmed_id', input_id=pubmed_id,
+                                                               view=self.view, field=self.field)
+        return self.parent._build_model('abstract', self._abstract_from_json, retrieval_resp)
 
 
-    def _abstract_from_json(self, json):
+    @staticmethod
+    def _abstract_from_json(json):
         core_data = json.get('coredata')
         if core_data is not None:
             abstract = core_data.get('dc:description')
@@ -216,7 +943,7 @@ class AbstractRetrieval(object):
         return abstract
 
 
-class ArticleRetrieval(object):
+class ArticleRetrieval(BatchRetrievalMixin):
     """
         
     """
@@ -240,29 +967,137 @@ class ArticleRetrieval(object):
         """
         http://dev.elsevier.com/retrieval.html#!/Article_Retrieval/ArticleRetrieval
         """
-        # Make sure input_id is a string
-        if isinstance(input_id, int):
-            input_id = str(input_id)
-
-        input_id = quote(input_id)
-
-        url = self.parent.base_url + '/article/' + input_type + '/' + input_id
+        url = _article_url(self.parent.base_url, input_type, input_id)
 
         header = self.parent._get_default_headers()
         params = {}
 
-        resp = requests.get(url, headers=header, params=params)
+        resp = self.parent._send_get_request('article', url, headers=header, params=params)
 
         # Verification of connection
         if not resp.ok:
-            if resp.status_code in (401, 403):
-                raise ConnectionRefusedError('Client IP Address does not resolve to an account')
-            if resp.status_code == 400:
-                raise AuthenticationError('Full article access limited by Scopus. May be available elsewhere.')
-            else:
-                raise ConnectionError('Failed to connect to Scopus')
+            _check_article_status(resp.status_code)
+
+        return self.parent._build_model('article', self._article_from_json,
+                                        self.parent._decode('article', resp.content),
+                                        return_json, self.parent.entry_class)
+
+    def download(self, input_id, sink, input_type='doi', file_type='xml',
+                 chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """
+        Streams the full text of an article to a file or file-like object,
+        so only chunk_size bytes are held in memory at once.
+
+        Parameters
+        ----------
+        input_id : str
+        sink : str or file-like
+            A path, or an object with a write method. A path is written to
+            a temporary file first, so it only exists if the download was
+            complete.
+        input_type : str
+            {'doi', 'eid', 'pii', 'pubmed_id'}
+        file_type : str
+            {'xml', 'pdf', 'json'}
+        chunk_size : int
+
+        Returns
+        -------
+        int
+            Number of bytes written
+        """
+        try:
+            mime_type = ARTICLE_FORMATS[file_type]
+        except KeyError:
+            raise ValueError('Unrecognized file_type: %s' % file_type)
+
+        url = _article_url(self.parent.base_url, input_type, input_id)
+        header = self.parent._get_default_headers()
+        header['Accept'] = mime_type
+        params = {'httpAccept': mime_type}
+
+        with self.parent._send_get_request('article', url, headers=header, params=params,
+                                           stream=True) as resp:
+            if not resp.ok:
+                _check_article_status(resp.status_code)
+
+            if not isinstance(sink, str):
+                return _write_chunks(resp, sink, chunk_size)
+
+            temp_path = sink + '.part'
+            try:
+                with open(temp_path, 'wb') as f:
+                    n_bytes = _write_chunks(resp, f, chunk_size)
+                os.replace(temp_path, sink)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            return n_bytes
+
+    def download_many(self, ids, output_dir, id_type='doi', file_type='xml',
+                      max_workers=None, overwrite=False, ordered=False):
+        """
+        Downloads many articles concurrently, see download.
+
+        Each article is written to output_dir/<id>.<file_type>, with
+        characters that aren't allowed in file names replaced by '_'.
+
+        Parameters
+        ----------
+        ids : iterable
+        output_dir : str
+        id_type : str
+        file_type : str
+        max_workers : int
+            Defaults to the connection pool size
+        overwrite : bool
+            If False, articles that have already been downloaded are skipped
+        ordered : bool
+            See batch.iter_batch
+
+        Yields
+        ------
+        batch.BatchResult
+            The result is the path of the file
+        """
+        if max_workers is None:
+            max_workers = self.parent.pool_size
+        os.makedirs(output_dir, exist_ok=True)
+
+        def download_one(input_id):
+            path = os.path.join(output_dir, _safe_filename(input_id) + '.' + file_type)
+            if overwrite or not os.path.exists(path):
+                self.download(input_id, path, input_type=id_type, file_type=file_type)
+            return path
 
-        retrieval_resp = resp.json().get('full-text-retrieval-response')
+        return iter_batch(download_one, ids, max_workers=max_workers, ordered=ordered)
+
+    def iter_paragraphs(self, input_id, input_type='doi'):
+        """
+        Yields (section_title, text) for each paragraph of an article, parsed
+        from the XML as it is downloaded.
+
+        See Also
+        --------
+        scopy.streaming.iter_paragraphs
+        """
+        url = _article_url(self.parent.base_url, input_type, input_id)
+        header = self.parent._get_default_headers()
+        header['Accept'] = ARTICLE_FORMATS['xml']
+        params = {'httpAccept': ARTICLE_FORMATS['xml']}
+
+        with self.parent._send_get_request('article', url, headers=header, params=params,
+                                           stream=True) as resp:
+            if not resp.ok:
+                _check_article_status(resp.status_code)
+            resp.raw.decode_content = True
+            for item in streaming.iter_paragraphs(resp.raw):
+                yield item
+
+    @staticmethod
+    def _article_from_json(json, return_json, entry_class=models.ScopusEntry):
+        retrieval_resp = json.get('full-text-retrieval-response')
 
         if retrieval_resp is None:
             return None
@@ -270,7 +1105,25 @@ class ArticleRetrieval(object):
         if return_json:
             return retrieval_resp
         else:
-            return models.ScopusEntry(retrieval_resp)
+            return entry_class(retrieval_resp)
+
+
+def _response_size(resp, stream):
+    if not stream:
+        return len(resp.content)
+    # The body hasn't been read yet
+    try:
+        return int(resp.headers.get('Content-Length', 0))
+    except ValueError:
+        return 0
+
+
+def _write_chunks(resp, sink, chunk_size):
+    n_bytes = 0
+    for chunk in resp.iter_content(chunk_size):
+        sink.write(chunk)
+        n_bytes += len(chunk)
+    return n_bytes
 
 
 class Authentication(object):
@@ -289,7 +1142,7 @@ class Authentication(object):
         header = dict()
         header['Accept'] = 'application/json'
 
-        key = self.parent.api_key()
+        key = self.parent.key
 
         params = dict()
         # params['apiKey'] = key
@@ -298,15 +1151,18 @@ class Authentication(object):
         header['X-ELS-APIKey'] = key
         header['X-ELS-ResourceVersion'] = 'XOCS'
 
-        resp = self.parent.session.get(self.url, headers=header, params=params)
+        resp = self.parent._send_get_request('search', self.url, headers=header, params=params)
 
 
-class BibliographyRetrieval(object):
+class BibliographyRetrieval(BatchRetrievalMixin):
     """
 
     """
     # TODO: check if there is even an entry first before trying to get the refs
 
+    view = view_for_attributes(['references'])
+    field = None
+
     def __init__(self, parent):
         self.parent = parent
 
@@ -323,7 +1179,8 @@ class BibliographyRetrieval(object):
         return self._generic_retrieval(input_id=pubmed_id, input_type='pubmed_id', return_json=return_json)
 
     def _generic_retrieval(self, input_id, input_type, return_json):
-        retrieval_resp = self.parent.make_abstract_get_request(input_type=input_type, input_id=input_id)
+        retrieval_resp = self.parent.make_abstract_get_request(input_type=input_type, input_id=input_id,
+                                                               view=self.view, field=self.field)
         ref_list = self._refs_from_json(retrieval_resp)
 
         if ref_list is None:
@@ -332,10 +1189,37 @@ class BibliographyRetrieval(object):
         if return_json:
             return ref_list
         else:
-            ref_object_list = []
-            for ref_json in ref_list:
-                ref_object_list.append(models.ScopusRef(ref_json))
-            return ref_object_list
+            return self._ref_objects_from_json(ref_list, self.parent.ref_class)
+
+    def iter_refs(self, input_id, input_type='eid', return_json=False):
+        """
+        Yields the references of a document as they are read from the
+        response, so memory use doesn't grow with the number of references.
+        This requires the ijson package.
+
+        Parameters
+        ----------
+        input_id : str
+        input_type : str
+            {'eid', 'doi', 'pii', 'pubmed_id'}
+        return_json : bool
+            If True the json of each reference is yielded rather than a
+            reference object (see Scopus.ref_class)
+
+        See Also
+        --------
+        scopy.streaming.iter_refs_json
+        """
+        ref_class = self.parent.ref_class
+        with self.parent.stream_abstract_get_request(input_type=input_type, input_id=input_id,
+                                                     view=self.view, field=self.field) as resp:
+            for ref_json in streaming.iter_refs_json(resp.raw):
+                yield ref_json if return_json else ref_class(ref_json)
+
+    @staticmethod
+    def _ref_objects_from_json(ref_list, ref_class=models.ScopusRef):
+        # References are parsed when they are first accessed
+        return models.LazyRefList(ref_list, ref_class)
 
     @classmethod
     def _refs_from_json(cls, json):
@@ -357,69 +1241,94 @@ class BibliographyRetrieval(object):
 
             next_level = next_level.get('reference')
 
+        # A single reference is returned as a dict rather than a list
+        if isinstance(next_level, dict):
+            next_level = [next_level]
+
         return next_level
 
 
-class EntryRetrieval(object):
+class EntryRetrieval(BatchRetrievalMixin):
     """
     http://api.elsevier.com/documentation/AbstractRetrievalAPI.wadl
 
     """
+
+    # Everything read by models.ScopusEntry
+    view = view_for_attributes(['doi', 'title', 'authors', 'link', 'abstract'])
+    field = None
+
     def __init__(self, parent):
         self.parent = parent
 
     def get_from_eid(self,eid):
-        retrieval_resp = self.parent.make_abstract_get_request(input_type='eid', input_id=eid)
-        return models.ScopusEntry(retrieval_resp)
+        retrieval_resp = self.parent.make_abstract_get_request(input_type='eid', input_id=eid,
+                                                               view=self.view, field=self.field)
+        return self.parent._build_model('entry', self.parent.entry_class, retrieval_resp)
 
     def get_from_doi(self, doi):
-        retrieval_resp = self.parent.make_abstract_get_request(input_type='doi', input_id=doi)
-        return models.ScopusEntry(retrieval_resp)
+        retrieval_resp = self.parent.make_abstract_get_request(input_type='doi', input_id=doi,
+                                                               view=self.view, field=self.field)
+        return self.parent._build_model('entry', self.parent.entry_class, retrieval_resp)
 
     def get_from_pii(self, pii):
-        retrieval_resp = self.parent.make_abstract_get_request(input_type='pii', input_id=pii)
-        return models.ScopusEntry(retrieval_resp)
+        retrieval_resp = self.parent.make_abstract_get_request(input_type='pii', input_id=pii,
+                                                               view=self.view, field=self.field)
+        return self.parent._build_model('entry', self.parent.entry_class, retrieval_resp)
 
     def get_from_pubmed(self, pubmed_id):
-        retrieval_resp = self.parent.make_abstract_get_request(input_type='pubmed_id', input_id=pubmed_id)
-        return models.ScopusEntry(retrieval_resp)
+        retrieval_resp = self.parent.make_abstract_get_request(input_type='pubmed_id', input_id=pubmed_id,
+                                                               view=self.view, field=self.field)
+        return self.parent._build_model('entry', self.parent.entry_class, retrieval_resp)
 
 
-class GetAllData(object):
+class GetAllData(BatchRetrievalMixin):
     """
     Returns both the entry information and the full references (if available).
     """
+
+    view = view_for_attributes(['abstract', 'references'])
+    field = None
+
     def __init__(self, parent):
         self.parent = parent
 
     def get_from_eid(self,eid):
-        retrieval_resp = self.parent.make_abstract_get_request(input_type='eid', input_id=eid)
-        return self._construct_object(retrieval_resp)
+        retrieval_resp = self.parent.make_abstract_get_request(input_type='eid', input_id=eid,
+                                                               view=self.view, field=self.field)
+        return self.parent._build_model('all_data', self._construct_object, retrieval_resp,
+                                        self.parent.entry_class, self.parent.ref_class)
 
     def get_from_doi(self, doi):
-        retrieval_resp = self.parent.make_abstract_get_request(input_type='doi', input_id=doi)
-        return self._construct_object(retrieval_resp)
+        retrieval_resp = self.parent.make_abstract_get_request(input_type='doi', input_id=doi,
+                                                               view=self.view, field=self.field)
+        return self.parent._build_model('all_data', self._construct_object, retrieval_resp,
+                                        self.parent.entry_class, self.parent.ref_class)
 
     def get_from_pii(self, pii):
-        retrieval_resp = self.parent.make_abstract_get_request(input_type='pii', input_id=pii)
-        return self._construct_object(retrieval_resp)
+        retrieval_resp = self.parent.make_abstract_get_request(input_type='pii', input_id=pii,
+                                                               view=self.view, field=self.field)
+        return self.parent._build_model('all_data', self._construct_object, retrieval_resp,
+                                        self.parent.entry_class, self.parent.ref_class)
 
     def get_from_pubmed(self, pubmed_id):
-        retrieval_resp = self.parent.make_abstract_get_request(input_type='pubmed_id', input_id=pubmed_id)
-        return self._construct_object(retrieval_resp)
+        retrieval_resp = self.parent.make_abstract_get_request(input_type='pubmed_id', input_id=pubmed_id,
+                                                               view=self.view, field=self.field)
+        return self.parent._build_model('all_data', self._construct_object, retrieval_resp,
+                                        self.parent.entry_class, self.parent.ref_class)
 
-    def _construct_object(self, json):
+    @staticmethod
+    def _construct_object(json, entry_class=models.ScopusEntry, ref_class=models.ScopusRef):
         if json is None:
             return None
 
-        entry = models.ScopusEntry(json=json)
+        entry = entry_class(json)
 
         # Get references from the API response
         ref_list = BibliographyRetrieval._refs_from_json(json=json)
         references = []
         if ref_list is not None:
-            for ref_json in ref_list:
-                references.append(models.ScopusRef(ref_json))
+            references = BibliographyRetrieval._ref_objects_from_json(ref_list, ref_class)
 
         paper_info = PaperInfo()
         #paper_info.entry = utils.convert_to_dict(entry)
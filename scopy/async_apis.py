@@ -0,0 +1,364 @@
+"""
+asyncio version of the Scopus interface in scopy.apis
+
+This requires the aiohttp package. Responses are parsed by the same code
+as the blocking interface so both return the same objects.
+
+Usage
+-----
+async with AsyncScopus(max_concurrency=200) as api:
+    entries = await asyncio.gather(*[api.entry_retrieval.get_from_doi(doi)
+                                     for doi in dois])
+"""
+
+# Standard imports
+import asyncio
+import time
+
+# Third-party imports
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Local imports
+from . import models
+from . import config
+from .apis import Scopus, AbstractRetrieval, ArticleRetrieval, BibliographyRetrieval, EntryRetrieval
+from .apis import GetAllData
+from .apis import _abstract_url, _article_url, _search_params
+from .apis import _check_abstract_status, _check_search_status, _check_article_status
+from .apis import _raise_rate_limit_error, _get_retry_after, _get_model_classes
+from .cache import make_key as make_cache_key
+from .metrics import Metrics
+from .throttle import RateLimiter
+from .utils import get_json_decoder
+from .retry import RetryPolicy
+
+
+class AsyncScopus(object):
+    """
+    Attributes
+    ----------
+    max_concurrency : int
+        Maximum number of requests in flight at once. Requests over this
+        limit wait for a free slot.
+    retry_counts : collections.Counter
+        Number of retries made for each endpoint, the same as
+        metrics.retries
+    metrics : scopy.metrics.Metrics
+        See Scopus. Latencies don't include the wait for a free slot.
+    """
+
+    base_url = Scopus.base_url
+
+    def __init__(self, max_concurrency=100, timeout=(5, 30), cache=None, rate_limits=None,
+                 retry_policy=None, json_decoder=None, compact_models=False, keep_json=True,
+                 spread_quota=False):
+        """
+        Parameters
+        ----------
+        max_concurrency : int
+        timeout : float or (float, float)
+            Connect and read timeout in seconds
+        cache : scopy.cache.ResponseCache
+        rate_limits : dict
+            See Scopus
+        spread_quota : bool
+            See Scopus
+        retry_policy : scopy.retry.RetryPolicy
+            See Scopus
+        json_decoder : str or callable
+            See Scopus
+        compact_models : bool
+            See Scopus
+        keep_json : bool
+            See Scopus
+        """
+        if aiohttp is None:
+            raise ImportError('AsyncScopus requires the aiohttp package')
+
+        self.key = config.api_key
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.cache = cache
+        self.json_loads = get_json_decoder(json_decoder)
+        self.entry_class, self.ref_class = _get_model_classes(compact_models, keep_json)
+        if retry_policy is None:
+            retry_policy = RetryPolicy()
+        self.retry_policy = retry_policy
+        # Waits the retry policy wouldn't accept raise rather than sleep
+        self.rate_limiter = RateLimiter(rate_limits, spread_quota=spread_quota,
+                                        max_block=retry_policy.max_retry_after)
+        self.metrics = Metrics()
+
+        # The session and semaphore are created on first use so that they
+        # belong to the running event loop.
+        self._session = None
+        self._semaphore = None
+
+        self.abstract_retrieval = AsyncAbstractRetrieval(self)
+        self.article_retrieval = AsyncArticleRetrieval(self)
+        self.bibliography_retrieval = AsyncBibliographyRetrieval(self)
+        self.entry_retrieval = AsyncEntryRetrieval(self)
+        self.get_all_data = AsyncGetAllData(self)
+
+    def _get_session(self):
+        if self._session is None:
+            if isinstance(self.timeout, tuple):
+                connect, read = self.timeout
+            else:
+                connect = read = self.timeout
+            timeout = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    _get_default_headers = Scopus._get_default_headers
+
+    async def _send_get_request(self, endpoint, url, headers=None, params=None):
+        """
+        Parameters
+        ----------
+        endpoint : str
+            {'search', 'abstract', 'article'}
+
+        Returns
+        -------
+        (status_code, body)
+            body is bytes
+        """
+        session = self._get_session()
+        if headers is None:
+            headers = self._get_default_headers()
+        if params is not None:
+            # aiohttp only accepts strings for query values
+            params = {k: str(v) for k, v in params.items()}
+
+        policy = self.retry_policy
+        retry_exceptions = policy.retry_exceptions + (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+        attempt = 0
+        while True:
+            attempt += 1
+            wait = self.rate_limiter.reserve(endpoint)
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            try:
+                async with self._semaphore:
+                    start_time = time.perf_counter()
+                    async with session.get(url, headers=headers, params=params) as resp:
+                        body = await resp.read()
+                        status = resp.status
+                        resp_headers = resp.headers
+            except Exception as exc:
+                self.metrics.observe_request(endpoint, time.perf_counter() - start_time, error=exc)
+                if not isinstance(exc, retry_exceptions) or not policy.should_retry(attempt):
+                    raise
+                self._record_retry(endpoint)
+                await asyncio.sleep(policy.get_delay(attempt))
+                continue
+
+            self.metrics.observe_request(endpoint, time.perf_counter() - start_time, status,
+                                         len(body))
+            self.rate_limiter.update_from_headers(endpoint, resp_headers)
+
+            if status < 400:
+                return status, body
+
+            retry_after = _get_retry_after(resp_headers)
+            if policy.should_retry(attempt, status, retry_after):
+                self._record_retry(endpoint)
+                if status == 429 and retry_after is not None:
+                    self.rate_limiter.block(endpoint, retry_after)
+                await asyncio.sleep(policy.get_delay(attempt, retry_after))
+                continue
+
+            if status == 429:
+                _raise_rate_limit_error(self.rate_limiter, endpoint, resp_headers)
+
+            return status, body
+
+    quota = Scopus.quota
+
+    retry_counts = Scopus.retry_counts
+    _record_retry = Scopus._record_retry
+    _decode = Scopus._decode
+    _build_model = Scopus._build_model
+
+    def stats(self):
+        """
+        See Scopus.stats, there is no 'memo' cache
+        """
+        stats = self.metrics.snapshot()
+        caches = {}
+        if self.cache is not None:
+            caches['disk'] = {'hits': self.cache.hits, 'misses': self.cache.misses}
+        stats['cache'] = caches
+        return stats
+
+    prometheus_metrics = Scopus.prometheus_metrics
+
+    async def _get_json(self, endpoint, url, params, check_status):
+        status, body = await self._send_get_request(endpoint, url, params=params)
+        if status >= 400:
+            check_status(status)
+        return self._decode(endpoint, body)
+
+    async def make_abstract_get_request(self, url=None, input_id=None, input_type=None,
+                                        view='FULL', field=None, use_cache=True, refresh=False):
+        """
+        See Scopus.make_abstract_get_request
+        """
+        if field is not None:
+            if not isinstance(field, str):
+                field = ','.join(field)
+            cache_view = view + '|' + field
+        else:
+            cache_view = view
+
+        if url is None:
+            url = _abstract_url(self.base_url, input_type, input_id)
+            cache_key = make_cache_key('abstract', input_type, input_id, cache_view)
+        else:
+            cache_key = make_cache_key('abstract', 'url', url, cache_view)
+
+        cache = self.cache if use_cache else None
+
+        # The cache does blocking I/O, so it is used from the default executor
+        loop = asyncio.get_running_loop()
+        body = None
+        if cache is not None and not refresh:
+            body = await loop.run_in_executor(None, cache.get, cache_key)
+
+        if body is None:
+            params = {'view': view}
+            if field is not None:
+                params['field'] = field
+            status, body = await self._send_get_request('abstract', url, params=params)
+            if status >= 400:
+                _check_abstract_status(status)
+
+            if cache is not None:
+                await loop.run_in_executor(None, cache.set, cache_key, body)
+
+        resp_json = self._decode('abstract', body)
+        return resp_json.get('abstracts-retrieval-response')
+
+    async def search(self, search_string, view='standard', date_range=None, start=None, count=None,
+                     cursor=None):
+        """
+        See Scopus.search
+        """
+        url = self.base_url + '/search/scopus'
+        params = _search_params(search_string, view, date_range, start, count, cursor)
+
+        status, body = await self._send_get_request('search', url, params=params)
+        if status >= 400:
+            _check_search_status(status, body.decode('utf-8', 'replace'))
+
+        search_results = self._decode('search', body)['search-results']
+        return self._build_model('search_results', models.SearchResults, search_results)
+
+    async def count(self, search_string, date_range=None):
+        """
+        See Scopus.count
+        """
+        results = await self.search(search_string, date_range=date_range, count=1)
+        return int(results.total_results)
+
+
+class _AsyncRetrieval(object):
+    """
+    Provides the get_from_* methods, subclasses implement _generic_retrieval
+    """
+
+    def __init__(self, parent):
+        self.parent = parent
+
+    async def get_from_eid(self, eid, **kwargs):
+        return await self._generic_retrieval(eid, 'eid', **kwargs)
+
+    async def get_from_doi(self, doi, **kwargs):
+        return await self._generic_retrieval(doi, 'doi', **kwargs)
+
+    async def get_from_pii(self, pii, **kwargs):
+        return await self._generic_retrieval(pii, 'pii', **kwargs)
+
+    async def get_from_pubmed(self, pubmed_id, **kwargs):
+        return await self._generic_retrieval(pubmed_id, 'pubmed_id', **kwargs)
+
+
+class AsyncAbstractRetrieval(_AsyncRetrieval):
+
+    view = AbstractRetrieval.view
+    field = AbstractRetrieval.field
+
+    async def _generic_retrieval(self, input_id, input_type):
+        retrieval_resp = await self.parent.make_abstract_get_request(
+            input_type=input_type, input_id=input_id, view=self.view, field=self.field)
+        return self.parent._build_model('abstract', AbstractRetrieval._abstract_from_json,
+                                        retrieval_resp)
+
+
+class AsyncArticleRetrieval(_AsyncRetrieval):
+
+    async def _generic_retrieval(self, input_id, input_type, return_json=False):
+        url = _article_url(self.parent.base_url, input_type, input_id)
+        resp_json = await self.parent._get_json('article', url, {}, _check_article_status)
+        return self.parent._build_model('article', ArticleRetrieval._article_from_json, resp_json,
+                                        return_json, self.parent.entry_class)
+
+
+class AsyncBibliographyRetrieval(_AsyncRetrieval):
+
+    view = BibliographyRetrieval.view
+    field = BibliographyRetrieval.field
+
+    async def _generic_retrieval(self, input_id, input_type, return_json=False):
+        retrieval_resp = await self.parent.make_abstract_get_request(
+            input_type=input_type, input_id=input_id, view=self.view, field=self.field)
+        ref_list = BibliographyRetrieval._refs_from_json(retrieval_resp)
+
+        if ref_list is None:
+            return None
+
+        if return_json:
+            return ref_list
+        else:
+            return BibliographyRetrieval._ref_objects_from_json(ref_list, self.parent.ref_class)
+
+
+class AsyncEntryRetrieval(_AsyncRetrieval):
+
+    view = EntryRetrieval.view
+    field = EntryRetrieval.field
+
+    async def _generic_retrieval(self, input_id, input_type):
+        retrieval_resp = await self.parent.make_abstract_get_request(
+            input_type=input_type, input_id=input_id, view=self.view, field=self.field)
+        return self.parent._build_model('entry', self.parent.entry_class, retrieval_resp)
+
+
+class AsyncGetAllData(_AsyncRetrieval):
+
+    view = GetAllData.view
+    field = GetAllData.field
+
+    async def _generic_retrieval(self, input_id, input_type):
+        retrieval_resp = await self.parent.make_abstract_get_request(
+            input_type=input_type, input_id=input_id, view=self.view, field=self.field)
+        return self.parent._build_model('all_data', GetAllData._construct_object, retrieval_resp,
+                                        self.parent.entry_class, self.parent.ref_class)
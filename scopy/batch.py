@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Support for running many retrieval requests at once.
+
+Each request is run on a bounded thread pool. A failure for one id is
+stored on its BatchResult rather than raised so that it doesn't abort the
+rest of the batch.
+"""
+
+#Standard library
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .utils import property_values_to_string as pv
+
+#Names accepted for id_type, values are the get_from_* suffix
+ID_TYPES = {
+    'doi': 'doi',
+    'eid': 'eid',
+    'pii': 'pii',
+    'pubmed': 'pubmed',
+    'pubmed_id': 'pubmed',
+    'pmid': 'pubmed'}
+
+
+class BatchResult(object):
+    """
+    Attributes
+    ----------
+    index : int
+        Position of the id in the input.
+    input_id : str
+    result :
+        Value returned by the retrieval method, None if an error occurred.
+    error : Exception
+        Exception raised by the retrieval method, None on success.
+    """
+
+    __slots__ = ('index', 'input_id', 'result', 'error')
+
+    def __init__(self, index, input_id, result=None, error=None):
+        self.index = index
+        self.input_id = input_id
+        self.result = result
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return pv([
+            'index', self.index,
+            'input_id', self.input_id,
+            'result', '<%s>' % self.result.__class__.__name__,
+            'error', repr(self.error)])
+
+
+def iter_batch(function, ids, max_workers=16, ordered=True):
+    """
+    Calls function(input_id) for each id using a thread pool.
+
+    Parameters
+    ----------
+    function : callable
+    ids : iterable
+        Ids are consumed lazily so that very long inputs (or generators)
+        don't need to be held in memory.
+    max_workers : int
+        Maximum number of requests in flight at once.
+    ordered : bool
+        If True, results are yielded in the same order as the input ids,
+        each one as soon as it and all of the results before it are done.
+        If False, results are yielded as soon as they complete.
+
+    Yields
+    ------
+    BatchResult
+    """
+
+    def run(index, input_id):
+        try:
+            return BatchResult(index, input_id, result=function(input_id))
+        except Exception as exc:
+            return BatchResult(index, input_id, error=exc)
+
+    # Only a limited number of ids are submitted ahead of the results
+    # being consumed, this keeps memory bounded for large inputs.
+    max_pending = 2 * max_workers
+
+    id_iter = enumerate(ids)
+    pending = set()
+    done_results = {}
+    next_index = 0
+    exhausted = False
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            while not exhausted and len(pending) + len(done_results) < max_pending:
+                try:
+                    index, input_id = next(id_iter)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(executor.submit(run, index, input_id))
+
+            if not pending:
+                break
+
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                batch_result = future.result()
+                if ordered:
+                    done_results[batch_result.index] = batch_result
+                else:
+                    yield batch_result
+
+            while next_index in done_results:
+                yield done_results.pop(next_index)
+                next_index += 1
+
+
+class BatchRetrievalMixin(object):
+    """
+    Adds get_many to retrieval classes which implement the get_from_doi,
+    get_from_eid, get_from_pii and get_from_pubmed methods.
+    """
+
+    def get_many(self, ids, id_type='doi', max_workers=None, ordered=True, **kwargs):
+        """
+        Retrieves many ids concurrently.
+
+        Parameters
+        ----------
+        ids : iterable
+        id_type : str
+            {'doi', 'eid', 'pii', 'pubmed'}
+        max_workers : int
+            Defaults to the connection pool size of the Scopus instance.
+        ordered : bool
+            See iter_batch
+        **kwargs
+            Passed to the get_from_* method, e.g. return_json
+
+        Yields
+        ------
+        BatchResult
+
+        Examples
+        --------
+        for r in api.get_all_data.get_many(dois, id_type='doi', max_workers=16):
+            if r.ok:
+                print(r.result.doi)
+            else:
+                print(r.input_id, r.error)
+        """
+        try:
+            method = getattr(self, 'get_from_' + ID_TYPES[id_type])
+        except KeyError:
+            raise ValueError('Unrecognized id_type: %s' % id_type)
+
+        if max_workers is None:
+            max_workers = self.parent.pool_size
+
+        if kwargs:
+            function = lambda input_id: method(input_id, **kwargs)
+        else:
+            function = method
+
+        return iter_batch(function, ids, max_workers=max_workers, ordered=ordered)
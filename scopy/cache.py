@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+"""
+Response caching
+
+Abstract retrieval responses rarely change so they can be stored locally
+and reused between runs. A cache is given to Scopus on construction:
+
+    from scopy.cache import SQLiteCache
+    api = Scopus(cache=SQLiteCache('scopus_cache.sqlite', ttl=30*24*3600))
+
+Entries are keyed by (endpoint, id_type, id, view) and store the raw
+response body.
+
+MemoryLRU holds parsed responses in memory for the lifetime of a Scopus
+instance, so that retrieving an entry, abstract and bibliography for the
+same paper only makes one request.
+"""
+
+#Standard library
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from .utils import property_values_to_string as pv
+
+
+def make_key(endpoint, id_type, input_id, view):
+    return '\x1f'.join([endpoint, str(id_type), str(input_id), str(view)])
+
+
+class ResponseCache(object):
+    """
+    Base class for response caches. Subclasses implement _get, _set,
+    delete and clear.
+
+    Attributes
+    ----------
+    hits : int
+    misses : int
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        # Caches are used from several threads, this only guards the counts
+        self._count_lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns
+        -------
+        bytes or None
+            None if the key is not in the cache or has expired
+        """
+        value = self._get(key)
+        with self._count_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """
+        Parameters
+        ----------
+        key : str
+        value : bytes
+        """
+        self._set(key, value)
+
+    def __contains__(self, key):
+        """
+        True if the key is in the cache, without counting a hit or miss or
+        reading the value.
+        """
+        return self._contains(key)
+
+    def _contains(self, key):
+        return False
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, value):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    @property
+    def hit_rate(self):
+        n_lookups = self.hits + self.misses
+        if n_lookups == 0:
+            return None
+        return self.hits / n_lookups
+
+    def __repr__(self):
+        return pv([
+            'hits', self.hits,
+            'misses', self.misses,
+            'hit_rate', self.hit_rate])
+
+
+class SQLiteCache(ResponseCache):
+    """
+    Stores responses in a SQLite database file.
+
+    To keep reads cheap, access times (used for LRU eviction) are only
+    written every access_flush_size hits or with the next write. The
+    number and size of the entries are tracked by the instance, so other
+    processes writing to the same file make the limits approximate.
+
+    Attributes
+    ----------
+    path : str
+    ttl : float
+        Seconds an entry remains valid, None means entries never expire.
+    max_entries : int
+    max_bytes : int
+        When either limit is exceeded the least recently used entries are
+        evicted.
+    access_flush_size : int
+    """
+
+    # Number of least recently used entries deleted per statement
+    EVICT_BATCH_SIZE = 100
+
+    def __init__(self, path, ttl=None, max_entries=None, max_bytes=None,
+                 access_flush_size=1000):
+        super(SQLiteCache, self).__init__()
+
+        self.path = os.path.abspath(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.access_flush_size = access_flush_size
+
+        # The connection is shared between threads, access is serialized
+        # with the lock.
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, value BLOB, created REAL, accessed REAL, size INTEGER)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS responses_created ON responses (created)')
+        self._conn.commit()
+
+        self._n_entries, self._n_bytes = self._conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        self._accessed = {}  # key => access time not yet written
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, created, size FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+
+            value, created, size = row
+            if self.ttl is not None and now - created > self.ttl:
+                self._delete(key, size)
+                self._conn.commit()
+                return None
+
+            self._accessed[key] = now
+            if len(self._accessed) >= self.access_flush_size:
+                self._flush_accessed()
+                self._conn.commit()
+            return bytes(value)
+
+    def _contains(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT created FROM responses WHERE key = ?', (key,)).fetchone()
+        return row is not None and (self.ttl is None or time.time() - row[0] <= self.ttl)
+
+    def _set(self, key, value):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self._n_entries += 1
+            else:
+                self._n_bytes -= row[0]
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, value, created, accessed, size) '
+                'VALUES (?, ?, ?, ?, ?)', (key, value, now, now, len(value)))
+            self._n_bytes += len(value)
+            self._accessed.pop(key, None)
+
+            self._flush_accessed()
+            self._evict()
+            self._conn.commit()
+
+    def _flush_accessed(self):
+        if self._accessed:
+            self._conn.executemany('UPDATE responses SET accessed = ? WHERE key = ?',
+                                   [(t, k) for k, t in self._accessed.items()])
+            self._accessed.clear()
+
+    def _delete(self, key, size):
+        self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+        self._accessed.pop(key, None)
+        self._n_entries -= 1
+        self._n_bytes -= size
+
+    def _evict(self):
+        if self.ttl is not None:
+            cutoff = time.time() - self.ttl
+            n_expired, expired_bytes = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses WHERE created < ?',
+                (cutoff,)).fetchone()
+            if n_expired:
+                self._conn.execute('DELETE FROM responses WHERE created < ?', (cutoff,))
+                self._n_entries -= n_expired
+                self._n_bytes -= expired_bytes
+
+        while self._over_limit():
+            rows = self._conn.execute(
+                'SELECT key, size FROM responses ORDER BY accessed LIMIT ?',
+                (self.EVICT_BATCH_SIZE,)).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if not self._over_limit():
+                    break
+                self._delete(key, size)
+
+    def _over_limit(self):
+        return (self.max_entries is not None and self._n_entries > self.max_entries) or \
+            (self.max_bytes is not None and self._n_bytes > self.max_bytes)
+
+    def delete(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                self._delete(key, row[0])
+                self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM responses')
+            self._conn.commit()
+            self._accessed.clear()
+            self._n_entries = 0
+            self._n_bytes = 0
+
+    def __len__(self):
+        return self._n_entries
+
+    @property
+    def n_bytes(self):
+        return self._n_bytes
+
+    def close(self):
+        with self._lock:
+            self._flush_accessed()
+            self._conn.commit()
+            self._conn.close()
+
+
+class MemoryLRU(object):
+    """
+    Bounded in-memory store of parsed responses.
+
+    Concurrent requests for a key that is being loaded wait for that load
+    to finish rather than starting their own.
+
+    Attributes
+    ----------
+    max_entries : int
+    max_bytes : int
+        Limit on the sum of the sizes reported by the loader, None for
+        no limit.
+    hits : int
+    misses : int
+    """
+
+    def __init__(self, max_entries=128, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key => (value, size)
+        self._in_flight = {}  # key => Future
+        self._n_bytes = 0
+
+    def get(self, key):
+        """
+        Returns the stored value or None, without loading.
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def get_or_load(self, key, loader, refresh=False):
+        """
+        Parameters
+        ----------
+        key : str
+        loader : callable
+            Called with no arguments when the key is missing, returns
+            (value, size).
+        refresh : bool
+            If True the stored value is ignored and replaced.
+
+        Returns
+        -------
+        value
+        """
+        with self._lock:
+            if not refresh and key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key][0]
+
+            future = self._in_flight.get(key)
+            if future is None:
+                owner = True
+                future = Future()
+                self._in_flight[key] = future
+                self.misses += 1
+            else:
+                owner = False
+                self.hits += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            value, size = loader()
+        except BaseException as exc:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(exc)
+            raise
+
+        with self._lock:
+            del self._in_flight[key]
+            self._store(key, value, size)
+        future.set_result(value)
+
+        return value
+
+    def _store(self, key, value, size):
+        if key in self._data:
+            self._n_bytes -= self._data.pop(key)[1]
+
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        self._data[key] = (value, size)
+        self._n_bytes += size
+
+        while len(self._data) > self.max_entries or \
+                (self.max_bytes is not None and self._n_bytes > self.max_bytes):
+            _, (_, old_size) = self._data.popitem(last=False)
+            self._n_bytes -= old_size
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._n_bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def n_bytes(self):
+        return self._n_bytes
+
+    def __repr__(self):
+        return pv([
+            'entries', len(self._data),
+            'n_bytes', self._n_bytes,
+            'hits', self.hits,
+            'misses', self.misses])
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Breadth first crawling of the citation graph
+
+Starting from a set of papers, the references of each paper are
+retrieved, then the references of those references, and so on up to a
+maximum depth. Each paper is fetched at most once and the edges are
+written to a file as they are found.
+
+    api = Scopus(pool_size=16)
+    crawler = CitationCrawler(api, max_depth=2, edge_path='edges.tsv')
+    crawler.crawl(['10.1016/S0021-9290(01)00201-9'], id_type='doi')
+
+The edge file is tab separated with the columns:
+    source_eid, target_eid, target_doi, depth
+where depth is the depth of the source paper (0 for the seeds). The target
+ids are empty when the reference doesn't include them.
+"""
+
+#Standard library
+import os
+
+from .apis import BibliographyRetrieval
+from .batch import iter_batch
+from .models import get_ref_ids, EID_PREFIX
+from .scopy_errors import ReferencesNotFoundError
+from .utils import property_values_to_string as pv
+
+
+class CrawlStats(object):
+
+    def __init__(self):
+        self.n_fetched = 0
+        self.n_failed = 0
+        self.n_edges = 0
+        self.n_dropped = 0
+        self.depth = 0
+
+    def __repr__(self):
+        return pv([
+            'depth', self.depth,
+            'n_fetched', self.n_fetched,
+            'n_failed', self.n_failed,
+            'n_edges', self.n_edges,
+            'n_dropped', self.n_dropped])
+
+
+class CitationCrawler(object):
+    """
+    Attributes
+    ----------
+    api : scopy.Scopus
+    max_depth : int
+        References of papers at this depth are written as edges but not
+        fetched. 0 only fetches the seeds.
+    max_workers : int
+    max_frontier : int
+        Maximum number of papers queued for the next depth. Papers found
+        after the frontier is full are not fetched (counted in
+        stats.n_dropped), which bounds memory and run time.
+    edge_path : str
+    stats : CrawlStats
+    failed : list
+        (id_type, id, exception) for papers that couldn't be retrieved
+    """
+
+    def __init__(self, api, max_depth=1, max_workers=None, max_frontier=10000,
+                 edge_path='edges.tsv'):
+        self.api = api
+        self.max_depth = max_depth
+        if max_workers is None:
+            max_workers = api.pool_size
+        self.max_workers = max_workers
+        self.max_frontier = max_frontier
+        self.edge_path = edge_path
+
+        # Keys are 'eid:<eid>' or 'doi:<lowercase doi>'
+        self.seen = set()
+        self.stats = CrawlStats()
+        self.failed = []
+
+    def _mark_seen(self, eid=None, doi=None):
+        """
+        Returns True if the paper had already been seen.
+        """
+        keys = []
+        if eid is not None:
+            keys.append('eid:' + eid)
+        if doi is not None:
+            keys.append('doi:' + doi.lower())
+        was_seen = any(key in self.seen for key in keys)
+        self.seen.update(keys)
+        return was_seen
+
+    def _fetch(self, item):
+        id_type, input_id = item
+        return self.api.make_abstract_get_request(input_type=id_type, input_id=input_id,
+                                                  view=self.api.bibliography_retrieval.view)
+
+    def crawl(self, seeds, id_type='doi'):
+        """
+        Parameters
+        ----------
+        seeds : list
+            Ids of the papers to start from
+        id_type : str
+            {'doi', 'eid', 'pii', 'pubmed_id'}
+
+        Returns
+        -------
+        CrawlStats
+        """
+        frontier = []
+        for seed in seeds:
+            if id_type == 'eid':
+                seen = self._mark_seen(eid=seed)
+            elif id_type == 'doi':
+                seen = self._mark_seen(doi=seed)
+            else:
+                seen = False
+            if not seen:
+                frontier.append((id_type, seed))
+
+        mode = 'a' if os.path.exists(self.edge_path) else 'w'
+        with open(self.edge_path, mode) as edge_file:
+            depth = 0
+            while frontier:
+                self.stats.depth = depth
+                next_frontier = []
+                expand = depth < self.max_depth
+
+                for result in iter_batch(self._fetch, frontier, max_workers=self.max_workers,
+                                         ordered=False):
+                    if not result.ok:
+                        self.stats.n_failed += 1
+                        self.failed.append(result.input_id + (result.error,))
+                        continue
+
+                    self.stats.n_fetched += 1
+                    self._process(result.result, depth, expand, next_frontier, edge_file)
+
+                edge_file.flush()
+                frontier = next_frontier
+                depth += 1
+
+        return self.stats
+
+    def _process(self, json, depth, expand, next_frontier, edge_file):
+        if json is None:
+            return
+
+        coredata = json.get('coredata') or {}
+        source_eid = coredata.get('eid')
+        self._mark_seen(eid=source_eid, doi=coredata.get('prism:doi'))
+
+        try:
+            ref_list = BibliographyRetrieval._refs_from_json(json)
+        except ReferencesNotFoundError:
+            return
+        if ref_list is None:
+            return
+
+        lines = []
+        for ref_json in ref_list:
+            eid, doi = _get_ref_ids(ref_json)
+            if eid is None and doi is None:
+                continue
+
+            lines.append('%s\t%s\t%s\t%d\n' % (source_eid or '', eid or '', doi or '', depth))
+
+            if self._mark_seen(eid=eid, doi=doi) or not expand:
+                continue
+            if len(next_frontier) >= self.max_frontier:
+                self.stats.n_dropped += 1
+            elif eid is not None:
+                next_frontier.append(('eid', eid))
+            else:
+                next_frontier.append(('doi', doi))
+
+        edge_file.writelines(lines)
+        self.stats.n_edges += len(lines)
+
+
+
+def _get_ref_ids(ref_json):
+    """
+    Returns
+    -------
+    (eid, doi)
+        Either may be None
+    """
+    info = ref_json.get('ref-info')
+    if info is None:
+        return None, None
+
+    scopus_id, doi = get_ref_ids(info)
+    if scopus_id is not None:
+        return EID_PREFIX + scopus_id, doi
+    return None, doi
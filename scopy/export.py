@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Tabular export of search results, entries and references
+
+Columns are built directly from the JSON rather than creating an object
+per row. The *_to_columns functions return a dict of lists and only need
+the standard library. The *_to_frame and *_to_table functions wrap these
+in a pandas DataFrame or a pyarrow Table.
+
+    pages = [api.search(query, start=start, count=200) for start in range(0, 1000, 200)]
+    df = search_results_to_frame(pages)
+    write_parquet(df, 'results.parquet')
+"""
+
+from .models import SearchResults, SearchResultEntry
+from .models import _populate_entry_fields, _populate_ref_fields
+
+# Column name => JSON key
+SEARCH_COLUMNS = dict((name, name) for name in SearchResultEntry.fields())
+SEARCH_COLUMNS.update(SearchResultEntry.renamed_fields)
+del SEARCH_COLUMNS['links']
+
+ENTRY_COLUMNS = ('doi', 'eid', 'pii', 'title', 'publication', 'type', 'issn', 'volume',
+                 'issue', 'pages', 'date', 'abstract', 'authors', 'link')
+
+REF_COLUMNS = ('authors', 'title', 'volume', 'issue', 'date', 'pages', 'publication', 'eid',
+               'doi')
+
+# Multiple values are joined with this into a single string
+SEPARATOR = '; '
+
+
+def search_results_to_columns(results):
+    """
+    Parameters
+    ----------
+    results : iterable
+        models.SearchResults pages or raw 'search-results' JSON
+        dictionaries
+
+    Returns
+    -------
+    dict
+        Column name => list of values. Affiliations are reduced to a
+        string of affiliation names.
+    """
+    if isinstance(results, (SearchResults, dict)):
+        results = [results]
+
+    items = list(SEARCH_COLUMNS.items())
+    columns = dict((name, []) for name, _ in items)
+    for page in results:
+        if isinstance(page, SearchResults):
+            page = page.json
+        for entry in page.get('entry', []):
+            if 'error' in entry:
+                # Empty result sets contain a single error entry
+                continue
+            for name, key in items:
+                columns[name].append(entry.get(key))
+
+    columns['affiliation'] = [_join_affiliations(x) for x in columns['affiliation']]
+    return columns
+
+
+def entries_to_columns(entries):
+    """
+    Parameters
+    ----------
+    entries : iterable
+        models.ScopusEntry (or CompactScopusEntry) objects, or raw abstract
+        retrieval JSON dictionaries.
+
+    Returns
+    -------
+    dict
+        Column name => list of values. Authors and links are joined into
+        strings.
+    """
+    columns = dict((name, []) for name in ENTRY_COLUMNS)
+    row = _EntryRow()
+    for entry in entries:
+        if isinstance(entry, dict):
+            row.reset()
+            _populate_entry_fields(row, entry, _Author)
+            entry = row
+
+        for name in ENTRY_COLUMNS:
+            columns[name].append(getattr(entry, name, None))
+
+    columns['authors'] = [_join(x, lambda a: a.name) for x in columns['authors']]
+    columns['link'] = [_join(x) for x in columns['link']]
+    return columns
+
+
+def refs_to_columns(refs, source=None):
+    """
+    Parameters
+    ----------
+    refs : iterable
+        models.ScopusRef (or CompactScopusRef) objects, or raw reference
+        JSON dictionaries.
+    source : str
+        If not None a 'source' column is added with this value, e.g. the
+        eid of the citing paper. This allows stacking the references of
+        many papers.
+
+    Returns
+    -------
+    dict
+    """
+    columns = dict((name, []) for name in REF_COLUMNS)
+    row = _RefRow()
+    for ref in refs:
+        if isinstance(ref, dict):
+            row.reset()
+            _populate_ref_fields(row, ref)
+            ref = row
+
+        for name in REF_COLUMNS:
+            columns[name].append(getattr(ref, name, None))
+
+    columns['authors'] = [_join(x) for x in columns['authors']]
+    if source is not None:
+        columns['source'] = [source] * len(columns['authors'])
+    return columns
+
+
+def search_results_to_frame(results):
+    """
+    Returns
+    -------
+    pandas.DataFrame
+
+    See Also
+    --------
+    search_results_to_columns
+    """
+    return _to_frame(search_results_to_columns(results))
+
+
+def entries_to_frame(entries):
+    """
+    See entries_to_columns
+    """
+    return _to_frame(entries_to_columns(entries))
+
+
+def refs_to_frame(refs, source=None):
+    """
+    See refs_to_columns
+    """
+    return _to_frame(refs_to_columns(refs, source=source))
+
+
+def search_results_to_table(results):
+    """
+    Returns
+    -------
+    pyarrow.Table
+
+    See Also
+    --------
+    search_results_to_columns
+    """
+    return _to_table(search_results_to_columns(results))
+
+
+def entries_to_table(entries):
+    return _to_table(entries_to_columns(entries))
+
+
+def refs_to_table(refs, source=None):
+    return _to_table(refs_to_columns(refs, source=source))
+
+
+def write_parquet(table, path):
+    """
+    Parameters
+    ----------
+    table : pyarrow.Table or pandas.DataFrame
+    path : str
+    """
+    import pyarrow.parquet as pq
+    if not hasattr(table, 'schema'):
+        import pyarrow
+        table = pyarrow.Table.from_pandas(table, preserve_index=False)
+    pq.write_table(table, path)
+
+
+def _to_frame(columns):
+    import pandas
+    return pandas.DataFrame(columns)
+
+
+def _to_table(columns):
+    import pyarrow
+    return pyarrow.table(columns)
+
+
+def _join(values, get_value=None):
+    if values is None:
+        return None
+    if isinstance(values, str):
+        return values
+    if get_value is not None:
+        values = [get_value(x) for x in values]
+    return SEPARATOR.join(x for x in values if x is not None)
+
+
+def _join_affiliations(value):
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        value = [value]
+    return _join(value, lambda x: x.get('affilname'))
+
+
+class _Author(object):
+
+    __slots__ = ('name',)
+
+
+# Reused for every row when parsing raw JSON
+
+class _EntryRow(object):
+
+    __slots__ = ENTRY_COLUMNS + ('article',)
+
+    def reset(self):
+        self.type = None
+        self.issn = None
+        self.authors = []
+        self.link = None
+        self.article = None
+
+
+class _RefRow(object):
+
+    __slots__ = REF_COLUMNS + ('scopus_id',)
+
+    def reset(self):
+        self.authors = []
+        self.scopus_id = None
+        self.eid = None
+        self.doi = None
+        self.title = None
+        self.volume = None
+        self.issue = None
+        self.date = None
+        self.pages = None
+        self.publication = None
@@ -0,0 +1,484 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming harvest of search results to JSON lines files
+
+Results are written as they arrive so memory use doesn't grow with the
+size of the harvest. After each page a checkpoint file records how far
+the harvest got (the start offset or search cursor), and rerunning the
+same harvest continues from there.
+
+    api = Scopus()
+    harvester = Harvester(api, 'neuro.jsonl.gz')
+    harvester.harvest_search('TITLE-ABS-KEY(neuromodulation)')
+
+    # Optionally, the full abstract retrieval records
+    eids = (json.loads(line)['eid'] for line in gzip.open('neuro.jsonl.gz', 'rt'))
+    harvester.harvest_records(eids, id_type='eid', output_path='neuro_records.jsonl.gz')
+
+Files ending in .gz are gzip compressed. Each checkpointed block of lines
+is written as a separate gzip member, which gzip readers treat as one
+continuous stream.
+
+Large searches can also be split by publication year and harvested in
+parallel, see split_by_year and iter_sharded_search.
+"""
+
+#Standard library
+import gzip
+import hashlib
+import json
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .apis import MAX_OFFSET_RESULTS
+from .batch import iter_batch
+from .search_builder import compile_query
+from .utils import property_values_to_string as pv
+
+
+class _BlockWriter(object):
+    """
+    Appends blocks of lines to a file. On resume the file is truncated to
+    the last checkpointed size so that lines written after the checkpoint
+    aren't duplicated.
+    """
+
+    def __init__(self, path, offset=0):
+        self.path = path
+        self.compress = path.endswith('.gz')
+
+        mode = 'r+b' if os.path.exists(path) else 'wb'
+        self._file = open(path, mode)
+        self._file.truncate(offset)
+        self._file.seek(offset)
+        self.offset = offset
+
+    def write_lines(self, items):
+        """
+        Parameters
+        ----------
+        items : list
+            JSON serializable objects, one per line
+
+        Returns
+        -------
+        int
+            The file size after writing
+        """
+        if not items:
+            return self.offset
+
+        data = b''.join(json.dumps(x, ensure_ascii=False).encode('utf-8') + b'\n' for x in items)
+        if self.compress:
+            data = gzip.compress(data)
+
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        self.offset += len(data)
+        return self.offset
+
+    def close(self):
+        self._file.close()
+
+
+class Harvester(object):
+    """
+    Attributes
+    ----------
+    api : scopy.Scopus
+    output_path : str
+        File that search result entries are written to
+    checkpoint_path : str
+        JSON file recording the progress of the harvest
+    state : dict
+        The contents of the checkpoint
+    """
+
+    def __init__(self, api, output_path, checkpoint_path=None):
+        """
+        Parameters
+        ----------
+        api : scopy.Scopus
+        output_path : str
+            .jsonl or .jsonl.gz
+        checkpoint_path : str
+            Defaults to output_path + '.checkpoint'
+        """
+        self.api = api
+        self.output_path = output_path
+        if checkpoint_path is None:
+            checkpoint_path = output_path + '.checkpoint'
+        self.checkpoint_path = checkpoint_path
+
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path, 'r') as f:
+                self.state = json.load(f)
+        else:
+            self.state = {}
+
+    def _save_checkpoint(self):
+        temp_path = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.checkpoint_path)
+
+    def harvest_search(self, query, max_results=None, view='standard', date_range=None,
+                       page_size=None, use_cursor=None, overwrite=False):
+        """
+        Writes the raw 'search-results' entries of a search, one per line.
+
+        If a checkpoint exists for the same search the harvest continues
+        from the last completed page. Otherwise FileExistsError is raised
+        if output_path already exists, unless overwrite is True.
+
+        Parameters
+        ----------
+        query : str or search_builder.Query
+        max_results : int
+        view : str
+        date_range : str
+        page_size : int
+        use_cursor : bool
+            See Scopus.iter_search. By default cursors are used for searches
+            with more than MAX_OFFSET_RESULTS results.
+        overwrite : bool
+            Replace the output of a harvest that isn't checkpointed, e.g. of
+            a different search
+
+        Returns
+        -------
+        int
+            Total number of entries written (including previous runs)
+        """
+        # The checkpoint is JSON so Query objects are stored as strings
+        search = {'query': compile_query(query), 'view': view, 'date_range': date_range,
+                  'max_results': max_results, 'use_cursor': use_cursor}
+        state = self.state.get('search')
+        if state is None or state['search'] != search:
+            _check_new_output([self.output_path], overwrite)
+            state = {'search': search, 'start': 0, 'cursor': '*' if use_cursor else None,
+                     'offset': 0, 'complete': False}
+            self.state['search'] = state
+
+        if state['complete']:
+            return state['start']
+
+        if max_results is not None:
+            max_results -= state['start']
+
+        writer = _BlockWriter(self.output_path, state['offset'])
+        try:
+            pages = self.api._iter_search_pages(query, max_results=max_results, view=view,
+                                                date_range=date_range, page_size=page_size,
+                                                start=state['start'], cursor=state['cursor'],
+                                                switch_to_cursor=use_cursor is None)
+            for page in pages:
+                entries = [x.json for x in page.entries if 'error' not in x.json]
+                state['offset'] = writer.write_lines(entries)
+                state['start'] += len(page.entries)
+                # None for offset pages
+                state['cursor'] = page.next_cursor
+                self._save_checkpoint()
+        finally:
+            writer.close()
+
+        state['complete'] = True
+        self._save_checkpoint()
+
+        return state['start']
+
+    def harvest_records(self, ids, id_type='eid', output_path=None, max_workers=None,
+                        block_size=100, failed_path=None, overwrite=False):
+        """
+        Writes the full abstract retrieval record (as used by GetAllData)
+        for each id, one per line as {'id': id, 'record': json}.
+
+        Progress is recorded as the number of ids completed, along with a
+        hash of those ids, so the ids must be given in the same order when
+        resuming. ValueError is raised if they differ. Ids that failed are
+        written to failed_path as {'id': id, 'error': repr(error)} lines and
+        are not retried. Without a checkpoint for output_path,
+        FileExistsError is raised if either file already exists, unless
+        overwrite is True.
+
+        Parameters
+        ----------
+        ids : iterable
+        id_type : str
+            {'doi', 'eid', 'pii', 'pubmed_id'}
+        output_path : str
+            Defaults to output_path with '_records' added before the
+            extension
+        max_workers : int
+            Number of concurrent requests
+        block_size : int
+            Number of records written between checkpoints
+        failed_path : str
+            Defaults to output_path with '_failed' added before the
+            extension
+        overwrite : bool
+            Replace the files of a harvest that isn't checkpointed
+
+        Returns
+        -------
+        int
+            Number of ids completed (including previous runs)
+        """
+        if output_path is None:
+            root, ext = _split_ext(self.output_path)
+            output_path = root + '_records' + ext
+        if failed_path is None:
+            root, ext = _split_ext(output_path)
+            failed_path = root + '_failed' + ext
+        if max_workers is None:
+            max_workers = self.api.pool_size
+
+        state = self.state.get('records')
+        if state is None or state['output_path'] != output_path or 'ids_hash' not in state:
+            _check_new_output([output_path, failed_path], overwrite)
+            state = {'output_path': output_path, 'id_type': id_type, 'n_done': 0,
+                     'offset': 0, 'ids_hash': None, 'n_failed': 0, 'failed_offset': 0}
+            self.state['records'] = state
+
+        view = self.api.get_all_data.view
+
+        def get_record(input_id):
+            return self.api.make_abstract_get_request(input_type=id_type, input_id=input_id,
+                                                      view=view)
+
+        # Hash of the completed ids, to check that a resumed harvest is
+        # given the same ids
+        ids_hash = hashlib.sha1()
+        ids = iter(ids)
+        for _ in range(state['n_done']):
+            input_id = next(ids, None)
+            if input_id is None:
+                break
+            _update_ids_hash(ids_hash, input_id)
+        if state['n_done'] and ids_hash.hexdigest() != state['ids_hash']:
+            raise ValueError('The ids differ from those of the checkpointed harvest, '
+                             'delete %s to start again' % self.checkpoint_path)
+
+        writer = _BlockWriter(output_path, state['offset'])
+        failed_writer = _BlockWriter(failed_path, state['failed_offset'])
+        block = []
+        failed = []
+        n_in_block = 0
+
+        def save_block():
+            state['offset'] = writer.write_lines(block)
+            state['failed_offset'] = failed_writer.write_lines(failed)
+            state['n_done'] += n_in_block
+            state['n_failed'] += len(failed)
+            state['ids_hash'] = ids_hash.hexdigest()
+            self._save_checkpoint()
+
+        try:
+            for result in iter_batch(get_record, ids, max_workers=max_workers, ordered=True):
+                n_in_block += 1
+                _update_ids_hash(ids_hash, result.input_id)
+                if result.ok:
+                    block.append({'id': result.input_id, 'record': result.result})
+                else:
+                    failed.append({'id': result.input_id, 'error': repr(result.error)})
+
+                if n_in_block >= block_size:
+                    save_block()
+                    block = []
+                    failed = []
+                    n_in_block = 0
+
+            if n_in_block:
+                save_block()
+        finally:
+            writer.close()
+            failed_writer.close()
+
+        return state['n_done']
+
+
+def _check_new_output(paths, overwrite):
+    # Starting a new harvest truncates its files, which mustn't silently
+    # delete a previous harvest, e.g. after its checkpoint was lost
+    if overwrite:
+        return
+    for path in paths:
+        if os.path.exists(path):
+            raise FileExistsError('%s exists but is not part of the checkpointed harvest, '
+                                  'pass overwrite=True to replace it' % path)
+
+
+def _update_ids_hash(ids_hash, input_id):
+    ids_hash.update(str(input_id).encode('utf-8') + b'\x1f')
+
+
+def _split_ext(path):
+    for ext in ('.jsonl.gz', '.ndjson.gz', '.gz'):
+        if path.endswith(ext):
+            return path[:-len(ext)], ext
+    return os.path.splitext(path)
+
+
+class Shard(object):
+    """
+    A part of a search restricted to a range of publication years.
+
+    Attributes
+    ----------
+    date_range : str
+        e.g. '2001-2004' or '2010'
+    n_results : int
+    use_cursor : bool
+        True if the shard has too many results for offset paging
+    """
+
+    def __init__(self, date_range, n_results, use_cursor=False):
+        self.date_range = date_range
+        self.n_results = n_results
+        self.use_cursor = use_cursor
+
+    def __repr__(self):
+        return pv([
+            'date_range', self.date_range,
+            'n_results', self.n_results,
+            'use_cursor', self.use_cursor])
+
+
+def split_by_year(api, query, start_year, end_year, max_results=MAX_OFFSET_RESULTS):
+    """
+    Splits a search into year ranges with at most max_results results each.
+
+    Ranges with too many results are bisected until they contain a single
+    year. A single year that still has too many results is marked to be
+    harvested with cursor paging, which has no result limit.
+
+    Parameters
+    ----------
+    api : scopy.Scopus
+    query : str
+    start_year : int
+    end_year : int
+        Inclusive
+    max_results : int
+
+    Returns
+    -------
+    list of Shard
+        Empty ranges are left out
+    """
+    shards = []
+    ranges = [(start_year, end_year)]
+    while ranges:
+        first, last = ranges.pop()
+        date_range = str(first) if first == last else '%d-%d' % (first, last)
+        n_results = api.count(query, date_range=date_range)
+        if n_results == 0:
+            continue
+        elif n_results <= max_results:
+            shards.append(Shard(date_range, n_results))
+        elif first == last:
+            shards.append(Shard(date_range, n_results, use_cursor=True))
+        else:
+            middle = (first + last) // 2
+            ranges.append((middle + 1, last))
+            ranges.append((first, middle))
+
+    return shards
+
+
+def iter_sharded_search(api, query, start_year, end_year, max_workers=4, view='standard',
+                        max_results_per_shard=MAX_OFFSET_RESULTS):
+    """
+    Harvests a search by splitting it into year ranges which are fetched
+    in parallel. Entries are deduplicated by eid.
+
+    Entries are yielded as pages arrive so they are not in any particular
+    order. Only the eids seen so far are kept in memory.
+
+    Parameters
+    ----------
+    api : scopy.Scopus
+    query : str
+    start_year : int
+    end_year : int
+    max_workers : int
+        Number of shards fetched at once, this should not be larger than
+        the pool_size of api
+    view : str
+    max_results_per_shard : int
+        See split_by_year
+
+    Yields
+    ------
+    models.SearchResultEntry
+
+    Examples
+    --------
+    for entry in iter_sharded_search(api, 'SUBJAREA(NEUR)', 1990, 2016, max_workers=8):
+        print(entry.eid)
+    """
+    shards = split_by_year(api, query, start_year, end_year, max_results=max_results_per_shard)
+    if not shards:
+        return
+
+    # Pages are handed from the workers through a bounded queue so that
+    # memory stays bounded if the consumer is slower than the workers
+    pages = queue.Queue(maxsize=2 * max_workers)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def harvest_shard(shard):
+        try:
+            cursor = '*' if shard.use_cursor else None
+            shard_pages = api._iter_search_pages(query, view=view, date_range=shard.date_range,
+                                                 prefetch=False, cursor=cursor)
+            # Checked before each request, including the first
+            while not stop.is_set():
+                page = next(shard_pages, None)
+                if page is None:
+                    break
+                put(page.entries)
+            put(done)
+        except BaseException as exc:
+            put(exc)
+
+    seen = set()
+    n_done = 0
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for shard in shards:
+            executor.submit(harvest_shard, shard)
+
+        while n_done < len(shards):
+            item = pages.get()
+            if item is done:
+                n_done += 1
+            elif isinstance(item, BaseException):
+                raise item
+            else:
+                for entry in item:
+                    eid = entry.eid
+                    if eid in seen:
+                        continue
+                    seen.add(eid)
+                    yield entry
+    finally:
+        # Shards that haven't started are dropped, running ones stop
+        # before their next request
+        stop.set()
+        executor.shutdown(cancel_futures=True)
+
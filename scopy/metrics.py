@@ -0,0 +1,253 @@
+"""
+Request metrics for the Scopus client
+
+Every request made by a Scopus (or AsyncScopus) instance records its
+latency, status code and size, and the time spent decoding the JSON and
+building the returned objects is recorded as well.
+
+    api = Scopus()
+    ...
+    api.stats()['requests']['search']['latency']['mean']
+    print(api.prometheus_metrics())
+
+Latencies are in seconds and include reading the body, except for
+streamed responses.
+"""
+
+# Standard imports
+import threading
+from bisect import bisect_left
+from collections import Counter
+
+# Upper bounds of the histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram(object):
+    """
+    Attributes
+    ----------
+    buckets : tuple of float
+        Upper bounds of the buckets. Values above the last bound go in an
+        extra +Inf bucket.
+    counts : list of int
+        Values in each bucket (including the +Inf bucket), not cumulative
+    count : int
+    sum : float
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        """
+        Returns
+        -------
+        dict
+            count, sum, mean and buckets, a list of (upper bound, cumulative
+            count) with float('inf') as the last bound
+        """
+        cumulative = []
+        total = 0
+        for bound, n in zip(self.buckets + (float('inf'),), self.counts):
+            total += n
+            cumulative.append((bound, total))
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'buckets': cumulative}
+
+
+class Metrics(object):
+    """
+    Thread safe collection of request metrics, see Scopus.stats
+
+    Attributes
+    ----------
+    latency : dict
+        endpoint => Histogram
+    status_codes : collections.Counter
+        (endpoint, status code) => number of responses
+    errors : collections.Counter
+        (endpoint, exception name) => requests that failed without a
+        response, e.g. timeouts
+    bytes : collections.Counter
+        endpoint => bytes of response bodies (after decompression)
+    retries : collections.Counter
+        endpoint => number of retried requests
+    decode_time : dict
+        endpoint => Histogram of the time spent decoding JSON
+    model_time : dict
+        model name => Histogram of the time spent building objects
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.latency = {}
+        self.status_codes = Counter()
+        self.errors = Counter()
+        self.bytes = Counter()
+        self.retries = Counter()
+        self.decode_time = {}
+        self.model_time = {}
+
+    def reset(self):
+        # Cleared in place so references to them stay valid
+        with self._lock:
+            for values in (self.latency, self.status_codes, self.errors, self.bytes,
+                           self.retries, self.decode_time, self.model_time):
+                values.clear()
+
+    def _observe(self, histograms, name, seconds):
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+    def observe_request(self, endpoint, seconds, status_code=None, n_bytes=0, error=None):
+        """
+        Parameters
+        ----------
+        endpoint : str
+        seconds : float
+        status_code : int
+            None if no response was received
+        n_bytes : int
+        error : Exception
+            The exception raised if no response was received
+        """
+        with self._lock:
+            self._observe(self.latency, endpoint, seconds)
+            if status_code is not None:
+                self.status_codes[endpoint, status_code] += 1
+            if error is not None:
+                self.errors[endpoint, error.__class__.__name__] += 1
+            self.bytes[endpoint] += n_bytes
+
+    def observe_decode(self, endpoint, seconds):
+        with self._lock:
+            self._observe(self.decode_time, endpoint, seconds)
+
+    def observe_model(self, name, seconds):
+        with self._lock:
+            self._observe(self.model_time, name, seconds)
+
+    def record_retry(self, endpoint):
+        with self._lock:
+            self.retries[endpoint] += 1
+
+    def snapshot(self):
+        """
+        Returns
+        -------
+        dict
+            'requests' : endpoint => dict of latency, status_codes, errors,
+                         bytes and retries
+            'decode' : endpoint => histogram snapshot
+            'models' : model name => histogram snapshot
+        """
+        with self._lock:
+            endpoints = set(self.latency) | set(self.retries)
+            requests = {}
+            for endpoint in endpoints:
+                latency = self.latency.get(endpoint)
+                requests[endpoint] = {
+                    'latency': latency.snapshot() if latency is not None else Histogram(()).snapshot(),
+                    'status_codes': {code: n for (e, code), n in self.status_codes.items()
+                                     if e == endpoint},
+                    'errors': {name: n for (e, name), n in self.errors.items() if e == endpoint},
+                    'bytes': self.bytes[endpoint],
+                    'retries': self.retries[endpoint]}
+
+            return {
+                'requests': requests,
+                'decode': {k: v.snapshot() for k, v in self.decode_time.items()},
+                'models': {k: v.snapshot() for k, v in self.model_time.items()}}
+
+
+def format_prometheus(stats, prefix='scopy'):
+    """
+    Formats the output of Scopus.stats in the Prometheus text format.
+
+    Parameters
+    ----------
+    stats : dict
+    prefix : str
+        Prepended to each metric name
+
+    Returns
+    -------
+    str
+    """
+    lines = []
+
+    def add_metric(name, metric_type, help_text, samples):
+        name = prefix + '_' + name
+        lines.append('# HELP %s %s' % (name, help_text))
+        lines.append('# TYPE %s %s' % (name, metric_type))
+        for suffix, labels, value in samples:
+            lines.append('%s%s%s %s' % (name, suffix, _format_labels(labels), _format_value(value)))
+
+    requests = stats['requests']
+    add_metric('request_seconds', 'histogram', 'Request latency in seconds',
+               _histogram_samples('endpoint', {k: v['latency'] for k, v in requests.items()}))
+    add_metric('responses_total', 'counter', 'Responses by status code',
+               [('', [('endpoint', endpoint), ('status', code)], n)
+                for endpoint, v in sorted(requests.items())
+                for code, n in sorted(v['status_codes'].items())])
+    add_metric('request_errors_total', 'counter', 'Requests that failed without a response',
+               [('', [('endpoint', endpoint), ('error', name)], n)
+                for endpoint, v in sorted(requests.items())
+                for name, n in sorted(v['errors'].items())])
+    add_metric('response_bytes_total', 'counter', 'Bytes of response bodies',
+               [('', [('endpoint', k)], v['bytes']) for k, v in sorted(requests.items())])
+    add_metric('retries_total', 'counter', 'Retried requests',
+               [('', [('endpoint', k)], v['retries']) for k, v in sorted(requests.items())])
+    add_metric('decode_seconds', 'histogram', 'Time spent decoding JSON in seconds',
+               _histogram_samples('endpoint', stats['decode']))
+    add_metric('model_seconds', 'histogram', 'Time spent building objects in seconds',
+               _histogram_samples('model', stats['models']))
+
+    caches = sorted(stats.get('cache', {}).items())
+    add_metric('cache_hits_total', 'counter', 'Cache hits',
+               [('', [('cache', k)], v['hits']) for k, v in caches])
+    add_metric('cache_misses_total', 'counter', 'Cache misses',
+               [('', [('cache', k)], v['misses']) for k, v in caches])
+
+    return '\n'.join(lines) + '\n'
+
+
+def _histogram_samples(label, histograms):
+    samples = []
+    for name, histogram in sorted(histograms.items()):
+        for bound, n in histogram['buckets']:
+            samples.append(('_bucket', [(label, name), ('le', bound)], n))
+        samples.append(('_sum', [(label, name)], histogram['sum']))
+        samples.append(('_count', [(label, name)], histogram['count']))
+    return samples
+
+
+def _format_labels(labels):
+    parts = []
+    for name, value in labels:
+        if isinstance(value, float):
+            value = _format_value(value)
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append('%s="%s"' % (name, value))
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
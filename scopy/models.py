@@ -8,12 +8,54 @@
 #PRISM
 #http://www.idealliance.org/specifications/prism-metadata-initiative
 
+from collections.abc import Sequence
+
 from .utils import get_truncated_display_string as td
 from .utils import get_list_class_display as cld
 from .utils import property_values_to_string as pv
 
 from pypub.scrapers.base_objects import *
 
+class _JsonField(object):
+    """
+    Accessor for a field of ResponseObject.json, created for each field of
+    a ResponseObject subclass when the class is created.
+
+    Objects created from the value (see ResponseObject.object_fields) are
+    stored on the instance, which then takes precedence over this (non-data)
+    descriptor, so they are only created once.
+    """
+
+    def __init__(self, name, key):
+        self.name = name
+        self.key = key
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        value = instance.json.get(self.key)
+        if value is None:
+            return None
+
+        # Looked up here rather than when the class is created so that
+        # object_fields can still be changed
+        method_fh = owner.object_fields.get(self.name)
+        if method_fh is None:
+            return value
+
+        value = method_fh(value)
+        instance.__dict__[self.name] = value
+        return value
+
+
+def _get_class_attribute(cls, name):
+    for base in cls.__mro__:
+        if name in base.__dict__:
+            return base.__dict__[name]
+    return None
+
+
 class ResponseObject(object):
     # I made this a property so that the user could change this processing
     # if they wanted. For example, this would allow the user to return authors
@@ -37,9 +79,26 @@ class ResponseObject(object):
         """
         self.json = json
 
+    def __init_subclass__(cls, **kwargs):
+        """
+        Creates the attribute accessors of the subclass so that __getattr__
+        doesn't need to run on every attribute lookup.
+        """
+        super(ResponseObject, cls).__init_subclass__(**kwargs)
+        accessors = [(x, x) for x in cls.fields()]
+        accessors.extend(cls.renamed_fields.items())
+        for name, key in accessors:
+            # Don't replace methods or properties with the same name
+            existing = _get_class_attribute(cls, name)
+            if existing is None or isinstance(existing, _JsonField):
+                setattr(cls, name, _JsonField(name, key))
+
     def __getattr__(self, name):
 
         """
+        Only called for names without an accessor, i.e. misspelled names or
+        fields added to the class after it was created.
+
         By checking for the name in the list of fields, we allow returning
         a "None" value for attributes that are not present in the JSON. By
         forcing each class to define the fields that are valid we ensure that
@@ -143,8 +202,20 @@ class SearchResults(ResponseObject):
             'start_index',self.start_index,
             'items_per_page',self.items_per_page,
             'entries',cld(self.entries),
-            'links',cld(self.links)])
-    
+            'links',cld(self.links),
+            'next_cursor',self.next_cursor])
+
+    @property
+    def next_cursor(self):
+        """
+        Cursor for the next page, only present when the search was made
+        with a cursor (see Scopus.search)
+        """
+        cursor = self.json.get('cursor')
+        if cursor is None:
+            return None
+        return cursor.get('@next')
+
     #TODO: Bring in navigation        
 
 class SearchResultEntryLinks(object):
@@ -210,6 +281,7 @@ class SearchResultEntry(ResponseObject):
         'cover_display_date' : 'prism:coverDisplayDate',
         'creator' : 'dc:creator',
         'description' : 'dc:description',
+        'doi' : 'prism:doi',
         'issn' : 'prism:issn',
         'issue' : 'prism:issueIdentifier',
         'links': 'link',
@@ -218,7 +290,8 @@ class SearchResultEntry(ResponseObject):
         'pubmed_id': 'pubmed-id',
         'source_id' : 'source-id',
         'subtype_description' : 'subtypeDescription',
-        'volume' : 'prims:volume'}
+        'title' : 'dc:title',
+        'volume' : 'prism:volume'}
             
     def __init__(self, json):
         """
@@ -235,6 +308,8 @@ class SearchResultEntry(ResponseObject):
    
     def __repr__(self):
         return pv([
+        'title',self.title,
+        'doi',self.doi,
         'description',self.description,        
         'aggregation_type',self.aggregation_type,
         'subtype',self.subtype,
@@ -259,81 +334,35 @@ class SearchResultEntry(ResponseObject):
         pass        
 
 
+# Scopus ids are the last part of the eid
+EID_PREFIX = '2-s2.0-'
+
+
 class ScopusRef(BaseRef):
+    """
+    Attributes
+    ----------
+    scopus_id : str
+    eid : str
+    doi : str
+        Identifiers of the referenced document, None if not given in the
+        reference. See scopy.resolve for finding ids for other references.
+    """
+
     def __init__(self, json):
         super().__init__()
         self.authors = []
+        self.scopus_id = None
+        self.eid = None
+        self.doi = None
 
         self._populate_fields(json)
 
     def __repr__(self):
-        return u'' \
-            'authors: %s\n' % self.authors + \
-            'title: %s\n' % self.title + \
-            'volume: %s\n' % self.volume + \
-            'issue: %s\n' % self.issue + \
-            'date: %s\n' % self.date + \
-            'pages: %s\n' % self.pages + \
-            'publication: %s\n' % self.publication
+        return _ref_repr(self)
 
     def _populate_fields(self, json):
-        info = json.get('ref-info')
-
-        # Descend through author JSON tree
-        next_level = info
-        x = 0
-        author_levels = ['ref-authors', 'author']
-        while next_level is not None and x < len(author_levels):
-            next_level = next_level.get(author_levels[x])
-            x += 1
-
-        # The above returns a list of authors.
-        # Iterate through and add the names to self.authors
-        if next_level is not None:
-            if not isinstance(next_level, dict):
-                for author in next_level:
-                    if 'ce:indexed-name' in author.keys():
-                        self.authors.append(author.get('ce:indexed-name'))
-                    elif ('ce:surname', 'ce:initials') in author.keys():
-                        name = ' '.join([author['ce:surname'], author['ce:initials']])
-                        self.authors.append(name)
-            else:
-                if 'ce:indexed-name' in next_level.keys():
-                    self.authors.append(next_level.get('ce:indexed-name'))
-                elif ('ce:surname', 'ce:initials') in next_level.keys():
-                    name = ' '.join([next_level['ce:surname'], next_level['ce:initials']])
-                    self.authors.append(name)
-
-        # Get page ranges
-        next_level = info
-        x = 0
-        page_levels = ['ref-volisspag', 'pagerange']
-        while next_level is not None and x < len(page_levels):
-            next_level = next_level.get(page_levels[x])
-            x += 1
-
-        if next_level is not None:
-            if ('@first', '@last') in next_level.keys():
-                self.pages = '-'.join([next_level['@first'], next_level['@last']])
-
-        # Get issue and volume:
-        voliss = info.get('voliss')
-        if voliss is not None:
-            self.issue = voliss.get('@issue')
-            self.volume = voliss.get('@volume')
-
-        # Get publication year
-        pubyear = info.get('ref-publicationyear')
-        if pubyear is not None:
-            self.date = pubyear.get('@first')
-
-        # Get title
-        title = info.get('ref-title')
-        if title is not None:
-            self.title = title.get('ref-titletext')
-
-        # Get publication
-        self.publication = info.get('ref-sourcetitle')
+        _populate_ref_fields(self, json)
 
 
 class ScopusEntry(BaseEntry):
@@ -354,64 +383,333 @@ class ScopusEntry(BaseEntry):
         self._populate_fields(json)
 
     def _populate_fields(self, json):
+        _populate_entry_fields(self, json, BaseAuthor)
+
+
+# The compact versions below store the same attributes as the classes above
+# but use __slots__ rather than an instance __dict__, which takes a fraction
+# of the memory when holding many of them (e.g. whole bibliographies).
+
+class CompactAuthor(object):
+
+    __slots__ = ('name',)
+
+    def __init__(self):
+        self.name = None
+
+    def __repr__(self):
+        return u'<CompactAuthor: %s>' % self.name
+
+
+class CompactScopusRef(object):
+    """
+    Slotted equivalent of ScopusRef. authors is a tuple of names.
+
+    Attributes
+    ----------
+    json : dict
+        The raw JSON, None if keep_json was False
+    """
 
-        coredata = json.get('coredata')
-        if coredata is None:
-            coredata = json.get('entry')
-
-        self.doi = coredata.get('prism:doi')
-        self.eid = coredata.get('eid')
-        self.pii = coredata.get('pii')
-        self.title = coredata.get('dc:title')
-        self.publication = coredata.get('prism:publicationName')
-        self.type = coredata.get('prism:aggregationType')
-        self.issn = coredata.get('prism:issn')
-        self.volume = coredata.get('prism:volume')
-        self.issue = coredata.get('prism:issueIdentifier')
-        self.pages = coredata.get('prism:pageRange')
-        self.date = coredata.get('prism:coverDate')
-        self.abstract = coredata.get('dc:description')
-
-        # Get authors
-        author_section = coredata.get('dc:creator')
-        if isinstance(author_section, dict) and 'author' in author_section.keys():
-            author_section = author_section.get('author')
-
-        if author_section is not None:
-            if isinstance(author_section, list):
-                for author in author_section:
-                    name = author.get('$')
-                    if name is None:
-                        name = author.get('ce:indexed-name')
-                    if name is not None:
-                        auth = BaseAuthor()
-                        auth.name = name
-                        self.authors.append(auth)
-            else:
-                name = author_section.get('$')
+    __slots__ = ('authors', 'title', 'volume', 'issue', 'date', 'pages',
+                 'publication', 'scopus_id', 'eid', 'doi', 'json')
+
+    def __init__(self, json, keep_json=True):
+        self.authors = []
+        self.scopus_id = None
+        self.eid = None
+        self.doi = None
+        self.title = None
+        self.volume = None
+        self.issue = None
+        self.date = None
+        self.pages = None
+        self.publication = None
+
+        _populate_ref_fields(self, json)
+
+        self.authors = tuple(self.authors)
+        self.json = json if keep_json else None
+
+    def __repr__(self):
+        return _ref_repr(self)
+
+
+class LazyRefList(Sequence):
+    """
+    The references of a document, which are only parsed into reference
+    objects when they are accessed.
+
+    Parsed references are kept so each is only parsed once. Call release()
+    to drop them again, e.g. after exporting the references of many
+    documents.
+
+    When the reference objects don't keep their json (keep_json=False, see
+    Scopus(compact_models=True)) neither does this list: the json of each
+    reference is dropped once it has been parsed, and release() can't
+    drop those references.
+
+    Attributes
+    ----------
+    json : list
+        The raw reference json, with None for the references that have
+        been parsed when keep_json is False
+    item_class :
+        Class used to parse each reference, e.g. ScopusRef
+    keep_json : bool
+    """
+
+    def __init__(self, json, ref_class=ScopusRef, keep_json=None):
+        # A document with a single reference has a dict rather than a list
+        if isinstance(json, dict):
+            json = [json]
+        if keep_json is None:
+            keep_json = _keeps_json(ref_class)
+        if not keep_json:
+            # A copy, as the response may also be held by the memo
+            json = list(json)
+        self.json = json
+        self.item_class = ref_class
+        self.keep_json = keep_json
+        self._items = [None] * len(json)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        item = self._items[index]
+        if item is None:
+            item = self.item_class(self.json[index])
+            self._items[index] = item
+            if not self.keep_json:
+                self.json[index] = None
+        return item
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def n_parsed(self):
+        return len(self._items) - self._items.count(None)
+
+    def release(self):
+        """
+        Drops the parsed references, they are parsed again if accessed.
+        References whose json has been dropped are kept.
+        """
+        if self.keep_json:
+            self._items = [None] * len(self._items)
+        else:
+            self._items = [None if x is not None else item
+                           for x, item in zip(self.json, self._items)]
+
+    def __repr__(self):
+        return '<LazyRefList %s, %d parsed>' % (cld(self), self.n_parsed)
+
+
+def _keeps_json(ref_class):
+    # The compact classes are passed as partials with keep_json set
+    keywords = getattr(ref_class, 'keywords', None) or {}
+    return keywords.get('keep_json', True)
+
+
+class CompactScopusEntry(object):
+    """
+    Slotted equivalent of ScopusEntry. Authors are CompactAuthor objects.
+
+    Attributes
+    ----------
+    json : dict
+        The raw JSON, None if keep_json was False
+    """
+
+    __slots__ = ('type', 'issn', 'authors', 'link', 'article', 'doi', 'eid', 'pii',
+                 'title', 'publication', 'volume', 'issue', 'pages', 'date',
+                 'abstract', 'json')
+
+    def __init__(self, json, keep_json=True):
+        self.type = None
+        self.issn = None
+        self.authors = []
+        self.link = None
+        self.article = None
+
+        _populate_entry_fields(self, json, CompactAuthor)
+
+        self.json = json if keep_json else None
+
+
+def _ref_repr(ref):
+    return u'' \
+        'authors: %s\n' % (ref.authors,) + \
+        'title: %s\n' % ref.title + \
+        'volume: %s\n' % ref.volume + \
+        'issue: %s\n' % ref.issue + \
+        'date: %s\n' % ref.date + \
+        'pages: %s\n' % ref.pages + \
+        'publication: %s\n' % ref.publication + \
+        'eid: %s\n' % ref.eid + \
+        'doi: %s\n' % ref.doi
+
+
+def _populate_ref_fields(ref, json):
+    info = json.get('ref-info')
+
+    # Descend through author JSON tree
+    next_level = info
+    x = 0
+    author_levels = ['ref-authors', 'author']
+    while next_level is not None and x < len(author_levels):
+        next_level = next_level.get(author_levels[x])
+        x += 1
+
+    # The above returns a list of authors.
+    # Iterate through and add the names to ref.authors
+    if next_level is not None:
+        if not isinstance(next_level, dict):
+            for author in next_level:
+                if 'ce:indexed-name' in author.keys():
+                    ref.authors.append(author.get('ce:indexed-name'))
+                elif ('ce:surname', 'ce:initials') in author.keys():
+                    name = ' '.join([author['ce:surname'], author['ce:initials']])
+                    ref.authors.append(name)
+        else:
+            if 'ce:indexed-name' in next_level.keys():
+                ref.authors.append(next_level.get('ce:indexed-name'))
+            elif ('ce:surname', 'ce:initials') in next_level.keys():
+                name = ' '.join([next_level['ce:surname'], next_level['ce:initials']])
+                ref.authors.append(name)
+
+    # Get page ranges
+    next_level = info
+    x = 0
+    page_levels = ['ref-volisspag', 'pagerange']
+    while next_level is not None and x < len(page_levels):
+        next_level = next_level.get(page_levels[x])
+        x += 1
+
+    if next_level is not None:
+        if ('@first', '@last') in next_level.keys():
+            ref.pages = '-'.join([next_level['@first'], next_level['@last']])
+
+    # Get issue and volume:
+    voliss = info.get('voliss')
+    if voliss is not None:
+        ref.issue = voliss.get('@issue')
+        ref.volume = voliss.get('@volume')
+
+    # Get publication year
+    pubyear = info.get('ref-publicationyear')
+    if pubyear is not None:
+        ref.date = pubyear.get('@first')
+
+    # Get title
+    title = info.get('ref-title')
+    if title is not None:
+        ref.title = title.get('ref-titletext')
+
+    # Get publication
+    ref.publication = info.get('ref-sourcetitle')
+
+    # Get identifiers
+    ref.scopus_id, ref.doi = get_ref_ids(info)
+    if ref.scopus_id is not None:
+        ref.eid = EID_PREFIX + ref.scopus_id
+
+
+def get_ref_ids(info):
+    """
+    Parameters
+    ----------
+    info : dict
+        The 'ref-info' section of a reference
+
+    Returns
+    -------
+    (scopus_id, doi)
+        Either may be None
+    """
+    id_list = info.get('refd-itemidlist')
+    if id_list is None:
+        return None, None
+
+    items = id_list.get('itemid')
+    if isinstance(items, dict):
+        items = [items]
+
+    scopus_id = None
+    doi = None
+    for item in items or []:
+        id_type = item.get('@idtype')
+        if id_type == 'SGR':
+            scopus_id = item.get('$')
+        elif id_type == 'DOI':
+            doi = item.get('$')
+    return scopus_id, doi
+
+
+def _populate_entry_fields(entry, json, author_class):
+    coredata = json.get('coredata')
+    if coredata is None:
+        coredata = json.get('entry')
+
+    entry.doi = coredata.get('prism:doi')
+    entry.eid = coredata.get('eid')
+    entry.pii = coredata.get('pii')
+    entry.title = coredata.get('dc:title')
+    entry.publication = coredata.get('prism:publicationName')
+    entry.type = coredata.get('prism:aggregationType')
+    entry.issn = coredata.get('prism:issn')
+    entry.volume = coredata.get('prism:volume')
+    entry.issue = coredata.get('prism:issueIdentifier')
+    entry.pages = coredata.get('prism:pageRange')
+    entry.date = coredata.get('prism:coverDate')
+    entry.abstract = coredata.get('dc:description')
+
+    # Get authors
+    author_section = coredata.get('dc:creator')
+    if isinstance(author_section, dict) and 'author' in author_section.keys():
+        author_section = author_section.get('author')
+
+    if author_section is not None:
+        if isinstance(author_section, list):
+            for author in author_section:
+                name = author.get('$')
                 if name is None:
-                    name = author_section.get('ce:indexed-name')
+                    name = author.get('ce:indexed-name')
                 if name is not None:
-                    auth = BaseAuthor()
+                    auth = author_class()
                     auth.name = name
-                    self.authors.append(auth)
-
-        # Get article links
-        links = coredata.get('link')
-        if isinstance(links, list):
-            self.link = []
-            for item in links:
-                link = item.get('@href')
-                if link is not None:
-                    self.link.append(link)
+                    entry.authors.append(auth)
         else:
-            link = links.get('@href')
+            name = author_section.get('$')
+            if name is None:
+                name = author_section.get('ce:indexed-name')
+            if name is not None:
+                auth = author_class()
+                auth.name = name
+                entry.authors.append(auth)
+
+    # Get article links
+    links = coredata.get('link')
+    if isinstance(links, list):
+        entry.link = []
+        for item in links:
+            link = item.get('@href')
             if link is not None:
-                self.link = link
-
-        # Get article (if returned in JSON)
-        article_text = json.get('originalText')
-        if isinstance(article_text, dict):
-            self.article = ''
-        else:
-            self.article = article_text
+                entry.link.append(link)
+    else:
+        link = links.get('@href')
+        if link is not None:
+            entry.link = link
+
+    # Get article (if returned in JSON)
+    article_text = json.get('originalText')
+    if isinstance(article_text, dict):
+        entry.article = ''
+    else:
+        entry.article = article_text
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Estimates the cost of a harvest before running it
+
+    api = Scopus()
+    plan = plan_harvest(api, 'TITLE-ABS-KEY(neuromodulation)', fetch_records=True)
+    print(plan)
+    if plan.exceeds_quota or not plan.within(max_seconds=3600):
+        ...
+
+Only one request is made, a search for a single result to get the number
+of results (see Scopus.count). Everything else is estimated from the
+configured rate limits and concurrency, and from the quota last reported
+by the server if any request has been made.
+"""
+
+from math import ceil
+
+from .apis import MAX_SEARCH_PAGE_SIZE, MAX_OFFSET_RESULTS
+from .utils import property_values_to_string as pv
+
+# Rough time for a request to come back, used when the rate limit isn't
+# the bottleneck. Search pages and full records tend to take longer than
+# this, so estimates are optimistic if the connection is slow.
+DEFAULT_LATENCY = 0.5
+
+
+class HarvestPlan(object):
+    """
+    Attributes
+    ----------
+    query : str
+    n_results : int
+        Number of results of the search
+    n_to_fetch : int
+        Number of results that would be harvested (limited by max_results)
+    page_size : int
+    n_pages : int
+        Number of search requests to page through the results
+    n_record_requests : int
+        Number of abstract or article requests, 0 unless fetch_records
+    n_requests : int
+        All requests, including the count request already made
+    quota_used : dict
+        endpoint => requests that count against the endpoint's quota
+    quota_remaining : dict
+        endpoint => remaining quota reported by the server, or None if unknown
+    needs_sharding : bool
+        True if there are more results than offset paging allows and
+        use_cursor is False, see harvest.split_by_year
+    estimated_seconds : float
+    """
+
+    def __init__(self, query, n_results, n_to_fetch, page_size, n_pages,
+                 n_record_requests, quota_used, quota_remaining, needs_sharding,
+                 estimated_seconds):
+        self.query = query
+        self.n_results = n_results
+        self.n_to_fetch = n_to_fetch
+        self.page_size = page_size
+        self.n_pages = n_pages
+        self.n_record_requests = n_record_requests
+        self.n_requests = 1 + n_pages + n_record_requests
+        self.quota_used = quota_used
+        self.quota_remaining = quota_remaining
+        self.needs_sharding = needs_sharding
+        self.estimated_seconds = estimated_seconds
+
+    @property
+    def exceeds_quota(self):
+        """
+        True if the harvest would use more than the remaining quota of any
+        endpoint, as far as is known.
+        """
+        for endpoint, used in self.quota_used.items():
+            remaining = self.quota_remaining.get(endpoint)
+            if remaining is not None and used > remaining:
+                return True
+        return False
+
+    def within(self, max_requests=None, max_seconds=None):
+        """
+        Returns True if the harvest fits the remaining quota and the given
+        limits.
+        """
+        if self.exceeds_quota:
+            return False
+        if max_requests is not None and self.n_requests > max_requests:
+            return False
+        if max_seconds is not None and self.estimated_seconds > max_seconds:
+            return False
+        return True
+
+    def __repr__(self):
+        return pv([
+            'query', self.query,
+            'n_results', self.n_results,
+            'n_to_fetch', self.n_to_fetch,
+            'page_size', self.page_size,
+            'n_pages', self.n_pages,
+            'n_record_requests', self.n_record_requests,
+            'n_requests', self.n_requests,
+            'quota_used', self.quota_used,
+            'quota_remaining', self.quota_remaining,
+            'exceeds_quota', self.exceeds_quota,
+            'needs_sharding', self.needs_sharding,
+            'estimated_seconds', '%0.1f' % self.estimated_seconds])
+
+
+def plan_harvest(api, query, max_results=None, view='standard', date_range=None,
+                 page_size=None, use_cursor=None, fetch_records=False,
+                 record_endpoint='abstract', max_workers=None, search_workers=1,
+                 latency=DEFAULT_LATENCY):
+    """
+    Parameters
+    ----------
+    api : scopy.Scopus
+    query : str or search_builder.Query
+    max_results : int
+    view : str
+        Search view, {'standard', 'complete'}
+    date_range : str
+    page_size : int
+        Defaults to the largest page allowed for the view
+    use_cursor : bool
+        Whether the harvest would use cursor paging, see Scopus.iter_search
+    fetch_records : bool
+        Include one record request per result, e.g. Harvester.harvest_records
+    record_endpoint : str
+        {'abstract', 'article'}
+    max_workers : int
+        Concurrent record requests, defaults to api.pool_size
+    search_workers : int
+        Concurrent searches, e.g. the max_workers of iter_sharded_search
+    latency : float
+        Assumed seconds for a request to come back
+
+    Returns
+    -------
+    HarvestPlan
+    """
+    if page_size is None:
+        page_size = MAX_SEARCH_PAGE_SIZE[view]
+    if max_workers is None:
+        max_workers = api.pool_size
+
+    n_results = api.count(query, date_range=date_range)
+    n_to_fetch = n_results if max_results is None else min(n_results, max_results)
+    n_pages = int(ceil(n_to_fetch / float(page_size)))
+    n_record_requests = n_to_fetch if fetch_records else 0
+
+    quota_used = {'search': n_pages}
+    if n_record_requests:
+        quota_used[record_endpoint] = n_record_requests
+
+    quota_remaining = {}
+    for endpoint in quota_used:
+        quota = api.quota(endpoint)
+        quota_remaining[endpoint] = None if quota is None else quota.remaining
+
+    limiter = api.rate_limiter
+    seconds = _request_seconds(n_pages, limiter.rate('search'), search_workers, latency)
+    seconds += _request_seconds(n_record_requests, limiter.rate(record_endpoint),
+                                max_workers, latency)
+
+    return HarvestPlan(
+        query=str(query),
+        n_results=n_results,
+        n_to_fetch=n_to_fetch,
+        page_size=page_size,
+        n_pages=n_pages,
+        n_record_requests=n_record_requests,
+        quota_used=quota_used,
+        quota_remaining=quota_remaining,
+        needs_sharding=n_to_fetch > MAX_OFFSET_RESULTS and use_cursor is False,
+        estimated_seconds=seconds)
+
+
+def _request_seconds(n_requests, rate, concurrency, latency):
+    # Requests are limited either by the rate limit or by how many can be
+    # waiting for a response at once
+    interval = latency / max(1, concurrency)
+    if rate:
+        interval = max(interval, 1.0 / rate)
+    return n_requests * interval
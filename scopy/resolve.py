@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Batched lookup of documents using OR'd search queries
+
+Rather than making one request per document, many documents are looked up
+at once with queries such as:
+
+    EID(2-s2.0-0023137155) OR DOI(10.1016/x) OR (TITLE("...") AND PUBYEAR IS 1999)
+
+and the results are then matched back to the documents that were asked for.
+"""
+
+#Standard library
+import re
+
+from .batch import iter_batch
+from . import search_builder as s
+from .search_builder import MAX_QUERY_LENGTH, encoded_length
+
+# Title terms can match several documents, so the terms per query are kept
+# well below the number of results returned in one page
+MAX_TERMS_PER_QUERY = 50
+MAX_RESULTS_PER_QUERY = 200
+
+_NON_ALPHANUMERIC = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def or_queries(terms, max_length=MAX_QUERY_LENGTH, max_terms=MAX_TERMS_PER_QUERY):
+    """
+    Packs terms into as few OR'd queries as possible.
+
+    Parameters
+    ----------
+    terms : iterable of str
+    max_length : int
+        Maximum URL encoded length of each query, see
+        search_builder.MAX_QUERY_LENGTH
+    max_terms : int
+        Maximum number of terms per query
+
+    Yields
+    ------
+    list of str
+        The terms of each query, join with ' OR ' to get the query
+    """
+    joiner_length = encoded_length(' OR ')
+    chunk = []
+    length = 0
+    for term in terms:
+        term_length = encoded_length(term)
+        if chunk and (length + joiner_length + term_length > max_length or len(chunk) >= max_terms):
+            yield chunk
+            chunk = []
+            length = 0
+        if chunk:
+            length += joiner_length
+        length += term_length
+        chunk.append(term)
+    if chunk:
+        yield chunk
+
+
+def normalize_title(title):
+    if title is None:
+        return None
+    return _NON_ALPHANUMERIC.sub(' ', title).strip().lower()
+
+
+def _id_term(field, value):
+    value = str(value).strip()
+    # DOIs may contain spaces which would otherwise split the term
+    return s.term(field, value, phrase=bool(re.search(r'\s', value))).query
+
+
+def _ref_term(ref):
+    if ref.eid is not None:
+        return _id_term('EID', ref.eid)
+    if ref.doi is not None:
+        return _id_term('DOI', ref.doi)
+    if ref.title:
+        term = s.title(ref.title, phrase=True)
+        if ref.date is not None and str(ref.date).isdigit():
+            term = '(%s)' % (term & s.pubyear(ref.date)).query
+        return str(term)
+    return None
+
+
+def resolve_refs(api, refs, max_workers=None, max_query_length=MAX_QUERY_LENGTH):
+    """
+    Finds the search entries for many references with few requests.
+
+    Matching is done by eid, then DOI, and then by normalized title. A
+    title match must have the same publication year when the reference
+    has one, otherwise it is only used if a single entry has that title
+    (short titles like "Introduction" are shared by many documents). When
+    an entry is found for a reference that is missing its eid or doi,
+    these are filled in on the reference.
+
+    Parameters
+    ----------
+    api : scopy.Scopus
+    refs : list
+        models.ScopusRef or models.CompactScopusRef objects
+    max_workers : int
+        Number of queries run at once, defaults to api.pool_size
+    max_query_length : int
+
+    Returns
+    -------
+    list
+        models.SearchResultEntry or None for each reference, in the same
+        order as refs
+    """
+    if max_workers is None:
+        max_workers = api.pool_size
+
+    terms = []
+    for ref in refs:
+        term = _ref_term(ref)
+        if term is not None:
+            terms.append(term)
+    # Duplicate refs only need to be looked up once
+    terms = list(dict.fromkeys(terms))
+
+    def run_query(chunk):
+        return list(api.iter_search(' OR '.join(chunk), max_results=MAX_RESULTS_PER_QUERY,
+                                    prefetch=False))
+
+    by_eid = {}
+    by_doi = {}
+    by_title = {}
+    chunks = or_queries(terms, max_length=max_query_length)
+    for result in iter_batch(run_query, chunks, max_workers=max_workers, ordered=False):
+        if not result.ok:
+            raise result.error
+        for entry in result.result:
+            if entry.eid is not None:
+                # The same document can be returned by several queries
+                if entry.eid in by_eid:
+                    continue
+                by_eid[entry.eid] = entry
+            if entry.doi is not None:
+                by_doi[entry.doi.lower()] = entry
+            title = normalize_title(entry.title)
+            if title:
+                by_title.setdefault(title, []).append(entry)
+
+    output = []
+    for ref in refs:
+        entry = None
+        if ref.eid is not None:
+            entry = by_eid.get(ref.eid)
+        if entry is None and ref.doi is not None:
+            entry = by_doi.get(ref.doi.lower())
+        if entry is None and ref.title:
+            entry = _match_title(by_title.get(normalize_title(ref.title)), ref.date)
+
+        if entry is not None:
+            if ref.eid is None:
+                ref.eid = entry.eid
+            if ref.doi is None:
+                ref.doi = entry.doi
+        output.append(entry)
+
+    return output
+
+
+def _match_title(entries, year):
+    if not entries:
+        return None
+    if year is None:
+        return entries[0] if len(entries) == 1 else None
+    for entry in entries:
+        cover_date = entry.cover_date
+        if cover_date is not None and cover_date[:4] == str(year):
+            return entry
+    return None
+
+
+# id_type => (search field code, function returning the id of an entry)
+ID_FIELDS = {
+    'doi': ('DOI', lambda entry: entry.doi),
+    'eid': ('EID', lambda entry: entry.eid),
+    'pii': ('PII', lambda entry: entry.json.get('pii')),
+    'pubmed': ('PMID', lambda entry: entry.pubmed_id),
+    'pubmed_id': ('PMID', lambda entry: entry.pubmed_id),
+    'pmid': ('PMID', lambda entry: entry.pubmed_id)}
+
+
+def _normalize_id(id_type, value):
+    value = str(value).strip()
+    if id_type in ('doi', 'pii'):
+        value = value.lower()
+    return value
+
+
+def resolve_ids(api, ids, id_type='doi', max_workers=None, max_query_length=MAX_QUERY_LENGTH):
+    """
+    Looks up many ids using OR'd search queries, see Scopus.resolve_ids
+
+    Returns
+    -------
+    (found, missing)
+        found : dict, id => models.SearchResultEntry
+        missing : list of ids with no matching entry
+    """
+    try:
+        field, get_id = ID_FIELDS[id_type]
+    except KeyError:
+        raise ValueError('Unrecognized id_type: %s' % id_type)
+    if max_workers is None:
+        max_workers = api.pool_size
+
+    # Normalized id => input id
+    wanted = {}
+    for input_id in ids:
+        wanted.setdefault(_normalize_id(id_type, input_id), input_id)
+
+    terms = (_id_term(field, x) for x in wanted.values())
+    chunks = or_queries(terms, max_length=max_query_length, max_terms=MAX_RESULTS_PER_QUERY)
+
+    def run_query(chunk):
+        return list(api.iter_search(' OR '.join(chunk), prefetch=False))
+
+    found = {}
+    for result in iter_batch(run_query, chunks, max_workers=max_workers, ordered=False):
+        if not result.ok:
+            raise result.error
+        for entry in result.result:
+            entry_id = get_id(entry)
+            if entry_id is None:
+                continue
+            input_id = wanted.get(_normalize_id(id_type, entry_id))
+            if input_id is not None and input_id not in found:
+                found[input_id] = entry
+
+    missing = [x for x in wanted.values() if x not in found]
+    return found, missing
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Retrying of failed requests
+
+Transient failures (rate limiting, server errors and dropped connections)
+are retried with exponential backoff. If the server sends a Retry-After
+header that delay is used instead.
+"""
+
+#Standard library
+import random
+
+#Third party
+import requests
+
+from .utils import property_values_to_string as pv
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+RETRY_EXCEPTIONS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    ConnectionResetError)
+
+
+class RetryPolicy(object):
+    """
+    Attributes
+    ----------
+    max_attempts : int
+        Total number of attempts including the first one. 1 disables retries.
+    backoff_factor : float
+        The delay before retry n (starting at 1) is
+        backoff_factor * 2**(n-1) seconds, capped at max_backoff.
+    max_backoff : float
+    jitter : bool
+        If True the delay is chosen uniformly between 0 and the computed
+        delay ("full jitter") so that threads which fail together don't
+        retry together.
+    max_retry_after : float
+        A Retry-After longer than this (e.g. when the weekly quota is used
+        up) is not waited for, the error is raised instead.
+    retry_statuses : tuple
+        Status codes which are retried
+    retry_exceptions : tuple
+        Exception classes which are retried
+    """
+
+    def __init__(self, max_attempts=5, backoff_factor=0.5, max_backoff=60, jitter=True,
+                 max_retry_after=300, retry_statuses=RETRY_STATUSES,
+                 retry_exceptions=RETRY_EXCEPTIONS):
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.max_retry_after = max_retry_after
+        self.retry_statuses = tuple(retry_statuses)
+        self.retry_exceptions = tuple(retry_exceptions)
+
+    def should_retry(self, attempt, status_code=None, retry_after=None):
+        """
+        Parameters
+        ----------
+        attempt : int
+            Number of attempts made so far
+        status_code : int
+            None when the attempt raised a retryable exception
+        retry_after : float
+            Delay requested by the server, if any
+        """
+        if attempt >= self.max_attempts:
+            return False
+        if status_code is not None and status_code not in self.retry_statuses:
+            return False
+        if retry_after is not None and retry_after > self.max_retry_after:
+            return False
+        return True
+
+    def get_delay(self, attempt, retry_after=None):
+        """
+        Returns the number of seconds to wait after the given attempt failed.
+        """
+        if retry_after is not None:
+            return retry_after
+
+        delay = min(self.max_backoff, self.backoff_factor * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def __repr__(self):
+        return pv([
+            'max_attempts', self.max_attempts,
+            'backoff_factor', self.backoff_factor,
+            'max_backoff', self.max_backoff,
+            'jitter', self.jitter,
+            'max_retry_after', self.max_retry_after,
+            'retry_statuses', self.retry_statuses])
@@ -5,3 +5,12 @@ class ReferencesNotFoundError(Exception):
 class AuthenticationError(Exception):
     pass
 
+class RateLimitError(ConnectionError):
+    """
+    Raised when Scopus responds with 429 (too many requests). retry_after
+    is the number of seconds to wait before trying again, if known.
+    """
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
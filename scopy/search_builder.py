@@ -1,88 +1,514 @@
 # -*- coding: utf-8 -*-
 """
-Still trying to decide on the design of this ...
-"""
+Builds Scopus search queries from Python expressions
+
+    import scopy.search_builder as s
+
+    q = s.title_abs_key('neuromodulation') & s.pubyear.after(2010) & ~s.doctype('re')
+    q.query
+    => '(TITLE-ABS-KEY(neuromodulation) AND PUBYEAR AFT 2010) AND NOT DOCTYPE(re)'
 
-#JAH: Perhaps we want to expose each field as a class?
-#TODO: Also provide convenience methods that group search fields
-#i.e. -> method to print common entries
-#     -> method to print identifier fields
-# authors, journal stuffs, paper stuffs (year, volume, issue, page #s)
+    api.search(q)
 
-#from search_builder import title, auth
-#   title('Testing') and auth('Smith')
-#
-#   __and__
-#   __or__
-#   AND NOT => this would be tricky, but doable
-#   - also tricky, the order of operations ...
-#
-#OR
+Operators
+---------
+a & b  => a AND b
+a | b  => a OR b
+a & ~b => a AND NOT b  (a - b is the same)
 
-#*********************************************
-#import search_builder as s  
-# s.title('Testing') and s.auth('Smith') #less importing work, more tab complete
+Note that in Python - binds more tightly than &, so a & b - c is a & (b - c).
 
+Scopus evaluates OR before AND, and AND before AND NOT. To avoid any
+ambiguity everything but single terms (e.g. nested combinations and query
+strings) is wrapped in parentheses when combined.
+
+Every field is a subclass of SearchTerm, named after the field code in
+lower case with '-' replaced by '_', e.g. title_abs_key => TITLE-ABS-KEY.
+ABS and ALL are abs_ and all_ so they don't shadow the builtins.
+
+Values containing characters that would break the query (parentheses,
+quotes or braces) are searched as a phrase. Use phrase=True to search a
+loose phrase ("heart attack") or exact=True for an exact phrase
+({heart attack}).
+"""
 
 #http://api.elsevier.com/content/search/fields/scopus
 #http://api.elsevier.com/documentation/search/SCOPUSSearchTips.htm
 
 #TODO: We may also want a GUI as well
 
-all_fields = {'abs':'Abstract'}
+import re
+from urllib.parse import quote_plus
+
+from .utils import property_values_to_string as pv
+
+# The server rejects very long URLs, this keeps well clear of the limit.
+# It is the length of the query once URL encoded, as sent in the request:
+# characters such as '/', '(' and ')' in DOIs take 3 characters each.
+MAX_QUERY_LENGTH = 3000
+
+#Field code => description
+all_fields = {
+    'ABS': 'Abstract',
+    'AF-ID': 'Affiliation id',
+    'AFFIL': 'Affiliation',
+    'AFFILCITY': 'Affiliation city',
+    'AFFILCOUNTRY': 'Affiliation country',
+    'AFFILORG': 'Affiliation organization',
+    'ALL': 'All fields',
+    'ARTNUM': 'Article number',
+    'AU-ID': 'Author id',
+    'AUTH': 'Author',
+    'AUTHCOLLAB': 'Collaboration author',
+    'AUTHFIRST': 'Author first name or initial',
+    'AUTHKEY': 'Author keywords',
+    'AUTHLASTNAME': 'Author last name',
+    'AUTHOR-NAME': 'Author name',
+    'CASREGNUMBER': 'CAS registry number',
+    'CHEM': 'Chemical',
+    'CHEMNAME': 'Chemical name',
+    'CODEN': 'CODEN',
+    'CONF': 'Conference',
+    'CONFLOC': 'Conference location',
+    'CONFNAME': 'Conference name',
+    'CONFSPONSORS': 'Conference sponsors',
+    'DOCTYPE': 'Document type',
+    'DOI': 'Digital Object Identifier',
+    'EDFIRST': 'Editor first name',
+    'EDITOR': 'Editor',
+    'EDLASTNAME': 'Editor last name',
+    'EID': 'Electronic identifier',
+    'EISSN': 'Electronic ISSN',
+    'EXACTSRCTITLE': 'Exact source title',
+    'FIRSTAUTH': 'First author',
+    'FUND-ACR': 'Funding acronym',
+    'FUND-NO': 'Funding number',
+    'FUND-SPONSOR': 'Funding sponsor',
+    'INDEXTERMS': 'Index terms',
+    'ISBN': 'ISBN',
+    'ISSN': 'ISSN',
+    'ISSNP': 'Print ISSN',
+    'ISSUE': 'Issue',
+    'KEY': 'Keywords',
+    'LANGUAGE': 'Language',
+    'LOAD-DATE': 'Date the document was last updated',
+    'MANUFACTURER': 'Manufacturer',
+    'ORIG-LOAD-DATE': 'Date the document was added',
+    'PAGEFIRST': 'First page',
+    'PAGELAST': 'Last page',
+    'PAGES': 'Page range',
+    'PII': 'Publication Item Identifier',
+    'PMID': 'PubMed id',
+    'PUBDATETXT': 'Publication date as text',
+    'PUBLISHER': 'Publisher',
+    'PUBYEAR': 'Publication year',
+    'REF': 'References',
+    'REFARTNUM': 'Reference article number',
+    'REFAUTH': 'Reference author',
+    'REFPAGE': 'Reference page',
+    'REFPAGEFIRST': 'Reference first page',
+    'REFPUBYEAR': 'Reference publication year',
+    'REFSRCTITLE': 'Reference source title',
+    'REFTITLE': 'Reference title',
+    'SEQBANK': 'Sequence bank',
+    'SEQNUMBER': 'Sequence number',
+    'SRCTITLE': 'Source title',
+    'SRCTYPE': 'Source type',
+    'SUBJAREA': 'Subject area',
+    'TITLE': 'Title',
+    'TITLE-ABS-KEY': 'Title, abstract and keywords',
+    'TITLE-ABS-KEY-AUTH': 'Title, abstract, keywords and authors',
+    'TRADENAME': 'Trade name',
+    'VOLUME': 'Volume',
+    'WEBSITE': 'Website'}
+
+_UNSAFE = re.compile(r'[(){}"]')
+
+
+class Query(object):
+    """
+    Base class of query expressions.
 
-class CombinedSearhTerms(object):
+    Attributes
+    ----------
+    query : str
+        The compiled query
+    length : int
+        Number of characters in the compiled query
+    """
 
-    #Keeps track of the individual terms
-    #Able to call a method which computes the final result
+    def __and__(self, other):
+        if isinstance(other, Not):
+            return CombinedSearchTerms('AND NOT', [self, other.term])
+        return CombinedSearchTerms('AND', [self, _as_query(other)])
 
-    def __and__(self):
-        pass
-    
-    def __or__(self):
-        pass
-    
-    def __not__(self):
-        pass
-    
+    def __rand__(self, other):
+        return _as_query(other) & self
+
+    def __or__(self, other):
+        return CombinedSearchTerms('OR', [self, _as_query(other)])
+
+    def __ror__(self, other):
+        return _as_query(other) | self
+
+    def __sub__(self, other):
+        return self.and_not(other)
+
+    def __invert__(self):
+        return Not(self)
+
+    def and_not(self, other):
+        return CombinedSearchTerms('AND NOT', [self, _as_query(other)])
+
+    @property
+    def query(self):
+        return self._compile()
+
+    @property
+    def length(self):
+        return len(self.query)
+
+    @property
+    def encoded_length(self):
+        """
+        Length of the query once URL encoded, see MAX_QUERY_LENGTH
+        """
+        return encoded_length(self.query)
+
+    def __str__(self):
+        return self.query
+
+    def _compile(self):
+        raise NotImplementedError
+
+
+class RawQuery(Query):
+    """
+    A query written directly in the Scopus syntax. Strings combined with
+    Query objects are converted to this.
+    """
+
+    def __init__(self, text):
+        self.text = text
+
+    def _compile(self):
+        return self.text
 
     def __repr__(self):
-        pass
+        return 'RawQuery(%r)' % self.text
 
 
-class SearchTerm(object):
-    
+class Not(Query):
+    """
+    The result of ~term. Scopus only supports NOT as part of AND NOT, so
+    this can only be used on the right side of &.
     """
 
-    #TODO: Define these attributes    
-    
+    def __init__(self, term):
+        self.term = term
+
+    def _compile(self):
+        raise ValueError('~term can only be used as: other & ~term')
+
+    def __repr__(self):
+        return 'Not(%r)' % self.term
+
+
+class CombinedSearchTerms(Query):
+    """
     Attributes
     ----------
-    key
-    value
-    description
-    Example
-    children
+    operator : str
+        {'AND', 'OR', 'AND NOT'}
+    children : list of Query
     """
 
-    def __and__(self):
-        pass
-    
-    def __or__(self):
-        pass
-    
-    def __not__(self):
-        pass
+    def __init__(self, operator, children):
+        self.operator = operator
+
+        # (a OR b) OR c => a OR b OR c, AND NOT is only flattened on the left
+        flattened = []
+        for i, child in enumerate(children):
+            if isinstance(child, CombinedSearchTerms) and child.operator == operator and \
+                    (operator != 'AND NOT' or i == 0):
+                flattened.extend(child.children)
+            else:
+                flattened.append(child)
+        self.children = flattened
+
+    def _compile(self):
+        return (' %s ' % self.operator).join(_child_text(x) for x in self.children)
+
+    def __repr__(self):
+        return pv([
+            'operator', self.operator,
+            'children', '[%s] len(%d)' % (self.children[0].__class__.__name__, len(self.children)),
+            'query', self.query])
+
+
+#Kept for backwards compatibility
+CombinedSearhTerms = CombinedSearchTerms
+
+
+def _as_query(value):
+    if isinstance(value, Query):
+        return value
+    if isinstance(value, str):
+        return RawQuery(value)
+    raise TypeError('Can not combine a query with %s' % type(value).__name__)
+
+
+def escape_value(value, phrase=False, exact=False):
+    """
+    Parameters
+    ----------
+    value : str
+    phrase : bool
+        Return a loose phrase, "value"
+    exact : bool
+        Return an exact phrase, {value}
+
+    Returns
+    -------
+    str
+    """
+    value = ' '.join(str(value).split())
+    if exact:
+        return '{%s}' % re.sub(r'[{}]', ' ', value).strip()
+    if phrase or _UNSAFE.search(value):
+        return '"%s"' % ' '.join(re.sub(r'["{}\\\\]', ' ', value).split())
+    return value
+
+
+def any_of(terms):
+    """
+    Combines terms with OR, e.g. any_of([doi(x) for x in dois])
+    """
+    terms = [_as_query(x) for x in terms]
+    if len(terms) == 1:
+        return terms[0]
+    return CombinedSearchTerms('OR', terms)
+
+
+def all_of(terms):
+    """
+    Combines terms with AND
+    """
+    terms = [_as_query(x) for x in terms]
+    if len(terms) == 1:
+        return terms[0]
+    return CombinedSearchTerms('AND', terms)
+
+
+def compile_query(query):
+    """
+    Returns the query string for a Query object or string.
+    """
+    if isinstance(query, Query):
+        return query.query
+    return query
+
+
+def encoded_length(text):
+    """
+    Returns the length of a query string once URL encoded, as it is sent
+    in the request.
+    """
+    return len(quote_plus(text))
+
+
+def split_query(query, max_length=MAX_QUERY_LENGTH):
+    """
+    Splits a query that is too long into several queries whose results
+    together are the results of the original query.
+
+    The longest OR list that isn't negated is split into parts, keeping
+    the rest of the query, e.g. A AND (x1 OR x2 OR x3 OR x4) becomes
+    A AND (x1 OR x2) and A AND (x3 OR x4). Results may need to be
+    deduplicated (e.g. by eid) if a document matches several parts.
+
+    Parameters
+    ----------
+    query : Query or str
+    max_length : int
+        Maximum URL encoded length of each query, see encoded_length
+
+    Returns
+    -------
+    list of str
+    """
+    text = compile_query(query)
+    text_length = encoded_length(text)
+    if text_length <= max_length:
+        return [text]
+    if not isinstance(query, Query):
+        raise ValueError('Query string is too long to be split (%d characters)' % text_length)
+
+    node = _find_longest_or(query)
+    if node is None:
+        raise ValueError('Query is too long and has no OR terms to split (%d characters)'
+                         % text_length)
+
+    # Length of the query without the OR list. Characters are encoded one
+    # at a time, so encoded lengths of the parts add up.
+    marker = RawQuery('\x00')
+    # The marker is wrapped in parentheses just as the OR list would be
+    overhead = encoded_length(_replace(query, node, marker).query) - encoded_length('\x00')
+
+    children = node.children
+    child_lengths = [encoded_length(_child_text(x)) for x in children]
+    joiner_length = encoded_length(' OR ')
+
+    queries = []
+    chunk = []
+    length = overhead
+    for child, child_length in zip(children, child_lengths):
+        if chunk and length + joiner_length + child_length > max_length:
+            queries.extend(split_query(_replace(query, node, any_of(chunk)), max_length))
+            chunk = []
+            length = overhead
+        if chunk:
+            length += joiner_length
+        length += child_length
+        chunk.append(child)
+
+    if len(chunk) == len(children):
+        raise ValueError('A single OR term of the query is too long')
+    queries.extend(split_query(_replace(query, node, any_of(chunk)), max_length))
+
+    return queries
+
+
+def _child_text(child):
+    # Anything but a single term is wrapped, this includes raw strings which
+    # may contain operators, and the right side of AND NOT which isn't
+    # flattened: a AND NOT (b AND NOT c)
+    text = child.query
+    if not isinstance(child, SearchTerm):
+        text = '(' + text + ')'
+    return text
+
+
+def _find_longest_or(query):
+    """
+    Returns the OR node with the longest query, ignoring those which are
+    negated (splitting those would change the results).
+    """
+    best = None
+    stack = [query]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, CombinedSearchTerms):
+            continue
+        if node.operator == 'OR' and len(node.children) > 1:
+            if best is None or node.length > best.length:
+                best = node
+        if node.operator == 'AND NOT':
+            stack.append(node.children[0])
+        else:
+            stack.extend(node.children)
+    return best
+
+
+def _replace(query, old, new):
+    if query is old:
+        return new
+    if not isinstance(query, CombinedSearchTerms):
+        return query
+    return CombinedSearchTerms(query.operator, [_replace(x, old, new) for x in query.children])
+
+
+class SearchTerm(Query):
     
-    @property
-    def query(self):
-        return '%s(%s)' % (self.key,self.value)
+    """
+    A single field search, e.g. TITLE(neuromodulation)
+
+    Attributes
+    ----------
+    key : str
+        Scopus field code
+    value : str
+    description : str
+    example : str
+    children : list
+        Narrower fields that are searched by this field
+    """
+
+    key = None
+    description = None
+    example = None
+    children = None
+
+    def __init__(self, text, phrase=False, exact=False):
+        self.value = text
+        self.phrase = phrase
+        self.exact = exact
+
+    def _compile(self):
+        return '%s(%s)' % (self.key, escape_value(self.value, self.phrase, self.exact))
 
     def __repr__(self):
         #Show attributes and include query
-        pass
-    
-    #Attributes
+        return pv([
+            'key', self.key,
+            'value', self.value,
+            'description', self.description,
+            'query', self.query])
+
+
+class _ComparisonTerm(SearchTerm):
+    """
+    Date fields are searched with operators rather than parentheses, e.g.
+    PUBYEAR AFT 2010
+    """
+
+    def __init__(self, value, operator='IS'):
+        self.value = value
+        self.operator = operator
+
+    @classmethod
+    def after(cls, value):
+        return cls(value, 'AFT')
+
+    @classmethod
+    def before(cls, value):
+        return cls(value, 'BEF')
+
+    @classmethod
+    def is_(cls, value):
+        return cls(value, 'IS')
+
+    @classmethod
+    def between(cls, first, last):
+        """
+        Inclusive range
+        """
+        return cls.after(_previous(first)) & cls.before(_next(last))
+
+    def _compile(self):
+        return '%s %s %s' % (self.key, self.operator, self.value)
+
+
+def _previous(value):
+    return int(value) - 1
+
+
+def _next(value):
+    return int(value) + 1
+
+
+def term(key, text, phrase=False, exact=False):
+    """
+    Creates a search term from a field code, e.g. term('DOI', doi)
+    """
+    output = SearchTerm(text, phrase=phrase, exact=exact)
+    output.key = key.upper()
+    output.description = all_fields.get(output.key)
+    return output
+
+
+def _make_field(name, key, base=SearchTerm):
+    return type(name, (base,), {'key': key, 'description': all_fields[key]})
  
 #These could also perform filtering on the input text depending upon the field, see subjarea example
 
@@ -95,29 +521,52 @@ class pii(SearchTerm):
     description = 'Publication Item Identifier'
     example = 'pii(S12345678) returns the document with the matching PII'
     children = None
-    
-    def __init__(self,text):
-        self.value = text
 
 
 class ref(SearchTerm):
-    
-    def __init__(self,text):
-        self.key = 'ref'
-        self.value = text
-        self.description = 'References'
-        self.example = 'TODO'
-        self.children = ['refauth','reftitle','refscrtitle','refpubyear','refpage'] #TODO: Not sure if these fields are case sensitive, examples are all caps
+
+    key = 'REF'
+    description = 'References'
+    example = 'TODO'
+    children = ['refauth','reftitle','refsrctitle','refpubyear','refpage']
 
 
 class subjarea(SearchTerm):
     
+    key = 'SUBJAREA'
+    description = 'Subject area'
+    example = 'subjarea(subjarea.MEDI)'
+
     #Does this work for tab complete? Yes!
     #s.subjarea(s.subjarea.AGRI)
     #Options:
     AGRI = 'AGRI'
     ARTS = 'ARTS'
     BIOC = 'BIOC'
+    BUSI = 'BUSI'
+    CENG = 'CENG'
+    CHEM = 'CHEM'
+    COMP = 'COMP'
+    DECI = 'DECI'
+    DENT = 'DENT'
+    EART = 'EART'
+    ECON = 'ECON'
+    ENER = 'ENER'
+    ENGI = 'ENGI'
+    ENVI = 'ENVI'
+    HEAL = 'HEAL'
+    IMMU = 'IMMU'
+    MATE = 'MATE'
+    MATH = 'MATH'
+    MEDI = 'MEDI'
+    NEUR = 'NEUR'
+    NURS = 'NURS'
+    PHAR = 'PHAR'
+    PHYS = 'PHYS'
+    PSYC = 'PSYC'
+    SOCI = 'SOCI'
+    VETE = 'VETE'
+    MULT = 'MULT'
 
     # Potential other versions:
     agriculture = 'AGRI'
@@ -141,66 +590,111 @@ class subjarea(SearchTerm):
     health = 'HEAL'
     immunology = 'IMMU'
     microbiology = 'IMMU'
+    materials_science = 'MATE'
     mathematics = 'MATH'
-    trade_publication = 'MEDI'
-    medicine = 'NEUR'
+    medicine = 'MEDI'
+    neuroscience = 'NEUR'
     nursing = 'NURS'
     pharmacology = 'PHAR'
+    physics = 'PHYS'
     psychology = 'PSYC'
     social_sciences = 'SOCI'
     veterinary = 'VETE'
     multidisciplinary = 'MULT'
-    
-    def __init__(self,text):
-
-        #We could pass in         
-        
-        self.key = 'subjarea'
-        self.value = text #We could validate this
-        self.description = 'TODO'
-        self.example = 'TODO'
-        self.children = None
 
 
 class title_abs_key(SearchTerm):
 
-    key = 'title-abs-key'
-
-    def __init__(self,text):
-        
-        self.key = 'title-abs-key' #Notice the rename
-        self.value = text
-        self.description = 'TODO'
-        self.example = 'TODO'
-        self.children = ['title','abs','key'] #these are sort of obvious
-
-
-
-"""
-class SearchTerm(object):
-
-
-    FIELDS_AND_NAMES = {'abs','Abstract'}    
-    
-    
-    def __setattr__(self, name, value):
-        #TODO: Look if it is valid
-    #TODO: On setting, add to a list and correct
-        #TODO: On display, display the correct value
-        pass
-    
-    def _null(self):
-        #Setting up tab complete
-        #http://api.elsevier.com/content/search/fields/scopus
-    
-        self.abs = None #Abstract
-        self.affil = None #Affiliation
-        self.affilcity = None #Affiliation city
-        self.affilcountry = None #Affiliation country
-        
-        self.pmid = None        
-        
-        self.title = None #Title
-        self.title_abs_key = None #Title abstract key - yikes, now we need a conversion to title-abs-key :/
-        self.title_abs_key_auth = None #Title, abstract, key, authors
-"""
\ No newline at end of file
+    key = 'TITLE-ABS-KEY' #Notice the rename
+    description = 'Title, abstract and keywords'
+    example = "title_abs_key('neuromodulation')"
+    children = ['title','abs','key'] #these are sort of obvious
+
+
+class pubyear(_ComparisonTerm):
+
+    key = 'PUBYEAR'
+    description = 'Publication year'
+    example = 'pubyear.after(2010) => PUBYEAR AFT 2010'
+
+
+class load_date(_ComparisonTerm):
+
+    key = 'LOAD-DATE'
+    description = all_fields['LOAD-DATE']
+    example = 'load_date.after(20150101)'
+
+
+class orig_load_date(_ComparisonTerm):
+
+    key = 'ORIG-LOAD-DATE'
+    description = all_fields['ORIG-LOAD-DATE']
+    example = 'orig_load_date.after(20150101)'
+
+
+#The remaining fields, written out for tab completion
+abs_ = _make_field('abs_', 'ABS')
+af_id = _make_field('af_id', 'AF-ID')
+affil = _make_field('affil', 'AFFIL')
+affilcity = _make_field('affilcity', 'AFFILCITY')
+affilcountry = _make_field('affilcountry', 'AFFILCOUNTRY')
+affilorg = _make_field('affilorg', 'AFFILORG')
+all_ = _make_field('all_', 'ALL')
+artnum = _make_field('artnum', 'ARTNUM')
+au_id = _make_field('au_id', 'AU-ID')
+auth = _make_field('auth', 'AUTH')
+authcollab = _make_field('authcollab', 'AUTHCOLLAB')
+authfirst = _make_field('authfirst', 'AUTHFIRST')
+authkey = _make_field('authkey', 'AUTHKEY')
+authlastname = _make_field('authlastname', 'AUTHLASTNAME')
+author_name = _make_field('author_name', 'AUTHOR-NAME')
+casregnumber = _make_field('casregnumber', 'CASREGNUMBER')
+chem = _make_field('chem', 'CHEM')
+chemname = _make_field('chemname', 'CHEMNAME')
+coden = _make_field('coden', 'CODEN')
+conf = _make_field('conf', 'CONF')
+confloc = _make_field('confloc', 'CONFLOC')
+confname = _make_field('confname', 'CONFNAME')
+confsponsors = _make_field('confsponsors', 'CONFSPONSORS')
+doctype = _make_field('doctype', 'DOCTYPE')
+doi = _make_field('doi', 'DOI')
+edfirst = _make_field('edfirst', 'EDFIRST')
+editor = _make_field('editor', 'EDITOR')
+edlastname = _make_field('edlastname', 'EDLASTNAME')
+eid = _make_field('eid', 'EID')
+eissn = _make_field('eissn', 'EISSN')
+exactsrctitle = _make_field('exactsrctitle', 'EXACTSRCTITLE')
+firstauth = _make_field('firstauth', 'FIRSTAUTH')
+fund_acr = _make_field('fund_acr', 'FUND-ACR')
+fund_no = _make_field('fund_no', 'FUND-NO')
+fund_sponsor = _make_field('fund_sponsor', 'FUND-SPONSOR')
+indexterms = _make_field('indexterms', 'INDEXTERMS')
+isbn = _make_field('isbn', 'ISBN')
+issn = _make_field('issn', 'ISSN')
+issnp = _make_field('issnp', 'ISSNP')
+issue = _make_field('issue', 'ISSUE')
+key = _make_field('key', 'KEY')
+language = _make_field('language', 'LANGUAGE')
+manufacturer = _make_field('manufacturer', 'MANUFACTURER')
+pagefirst = _make_field('pagefirst', 'PAGEFIRST')
+pagelast = _make_field('pagelast', 'PAGELAST')
+pages = _make_field('pages', 'PAGES')
+pmid = _make_field('pmid', 'PMID')
+pubdatetxt = _make_field('pubdatetxt', 'PUBDATETXT')
+publisher = _make_field('publisher', 'PUBLISHER')
+refartnum = _make_field('refartnum', 'REFARTNUM')
+refauth = _make_field('refauth', 'REFAUTH')
+refpage = _make_field('refpage', 'REFPAGE')
+refpagefirst = _make_field('refpagefirst', 'REFPAGEFIRST')
+refpubyear = _make_field('refpubyear', 'REFPUBYEAR')
+refsrctitle = _make_field('refsrctitle', 'REFSRCTITLE')
+reftitle = _make_field('reftitle', 'REFTITLE')
+seqbank = _make_field('seqbank', 'SEQBANK')
+seqnumber = _make_field('seqnumber', 'SEQNUMBER')
+srctitle = _make_field('srctitle', 'SRCTITLE')
+srctype = _make_field('srctype', 'SRCTYPE')
+title = _make_field('title', 'TITLE')
+title_abs_key_auth = _make_field('title_abs_key_auth', 'TITLE-ABS-KEY-AUTH')
+tradename = _make_field('tradename', 'TRADENAME')
+volume = _make_field('volume', 'VOLUME')
+website = _make_field('website', 'WEBSITE')
@@ -0,0 +1,143 @@
+"""
+Incremental parsing of large responses
+
+The FULL view of a review article can have thousands of references. Rather
+than decoding the whole response into one dict, the references are parsed
+one at a time as the response is read, so memory use doesn't depend on the
+size of the bibliography. This requires the ijson package.
+
+Full text articles can be requested as XML and their paragraphs read in
+the same way, see iter_paragraphs.
+
+Usage
+-----
+for ref in api.bibliography_retrieval.iter_refs(eid, 'eid'):
+    ...
+
+for section_title, text in api.article_retrieval.iter_paragraphs(doi):
+    ...
+"""
+
+# Standard imports
+import xml.etree.ElementTree as ET
+
+# Third-party imports
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Local imports
+from .scopy_errors import ReferencesNotFoundError
+
+BIBLIOGRAPHY_PREFIX = 'abstracts-retrieval-response.item.bibrecord.tail.bibliography'
+
+_START_EVENTS = ('start_map', 'start_array')
+_END_EVENTS = ('end_map', 'end_array')
+
+
+def iter_refs_json(stream, prefix=BIBLIOGRAPHY_PREFIX):
+    """
+    Yields the json of each reference in a response.
+
+    Parameters
+    ----------
+    stream : file-like
+        The (decompressed) response body, e.g. requests' resp.raw
+    prefix : str
+        ijson path of the bibliography
+
+    Yields
+    ------
+    dict
+        The same dicts that BibliographyRetrieval._refs_from_json returns
+    """
+    if ijson is None:
+        raise ImportError('Streaming references requires the ijson package')
+
+    ref_prefix = prefix + '.reference'
+    # References are in a list, or a dict if there is only one
+    start_prefixes = (ref_prefix, ref_prefix + '.item')
+    count_prefix = prefix + '.@refcount'
+
+    builder = None
+    depth = 0
+    for path, event, value in ijson.parse(stream, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if event in _START_EVENTS:
+                depth += 1
+            elif event in _END_EVENTS:
+                depth -= 1
+                if depth == 0:
+                    yield builder.value
+                    builder = None
+        elif event == 'start_map' and path in start_prefixes:
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+            depth = 1
+        elif path == count_prefix and str(value) == '0':
+            raise ReferencesNotFoundError('No references found. Possibly due to zero search results.')
+
+
+def _local_name(tag):
+    # '{http://www.elsevier.com/xml/common/dtd}para' => 'para'
+    return tag.rsplit('}', 1)[-1]
+
+
+def iter_paragraphs(source, para_tags=('para', 'simple-para'), section_tag='section',
+                    title_tag='section-title'):
+    """
+    Yields the paragraphs of a full text XML article without building the
+    whole document in memory.
+
+    Parameters
+    ----------
+    source : str or file-like
+        Path of an XML file or a stream, e.g. requests' resp.raw
+    para_tags : tuple of str
+        Tags of the paragraphs, without their namespace. Abstract paragraphs
+        are 'simple-para' elements.
+    section_tag : str
+    title_tag : str
+
+    Yields
+    ------
+    (section_title, text)
+        section_title is the title of the innermost section containing the
+        paragraph, or None outside of any section.
+    """
+    # Titles of the open sections
+    titles = []
+    # Open elements, and how many of them are paragraphs or titles whose
+    # text is still needed. Every other element is dropped once it ends so
+    # memory doesn't grow with the document.
+    open_elems = []
+    n_text = 0
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        name = _local_name(elem.tag)
+        if event == 'start':
+            open_elems.append(elem)
+            if name in para_tags or name == title_tag:
+                n_text += 1
+            elif name == section_tag:
+                titles.append(None)
+            continue
+
+        open_elems.pop()
+        if name == title_tag:
+            n_text -= 1
+            if titles and titles[-1] is None:
+                titles[-1] = ' '.join(''.join(elem.itertext()).split())
+        elif name in para_tags:
+            n_text -= 1
+            yield titles[-1] if titles else None, ' '.join(''.join(elem.itertext()).split())
+        elif name == section_tag:
+            titles.pop()
+
+        if not n_text:
+            elem.clear()
+            # Earlier children are already removed so this is the first
+            # child, the parser may have added later siblings
+            if open_elems:
+                open_elems[-1].remove(elem)
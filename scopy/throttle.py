@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Client side pacing of requests
+
+Elsevier throttles each API key per endpoint (requests per second) and
+also enforces a weekly quota. The current quota is returned in the
+response headers:
+
+    X-RateLimit-Limit     - requests allowed in the quota period
+    X-RateLimit-Remaining - requests left in the period
+    X-RateLimit-Reset     - epoch time (seconds) when the quota resets
+
+http://dev.elsevier.com/api_key_settings.html
+"""
+
+#Standard library
+import threading
+import time
+
+from .utils import property_values_to_string as pv
+from .scopy_errors import RateLimitError
+
+#Requests per second allowed by default for each endpoint
+DEFAULT_RATES = {
+    'search': 9,
+    'abstract': 9,
+    'article': 10}
+
+
+class TokenBucket(object):
+    """
+    Thread safe token bucket.
+
+    Attributes
+    ----------
+    rate : float
+        Tokens added per second
+    capacity : float
+        Maximum number of tokens that can accumulate, i.e. the largest
+        burst of requests that can be sent without waiting.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        if capacity is None:
+            capacity = max(1, rate)
+        self.capacity = capacity
+
+        self._lock = threading.Lock()
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._blocked_until = 0
+
+    def reserve(self):
+        """
+        Takes a token, returning how long the caller must wait (in seconds)
+        before it may use it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            wait = 0 if self._tokens >= 0 else -self._tokens / self.rate
+            return max(wait, self._blocked_until - now)
+
+    def acquire(self):
+        """
+        Blocks until a token is available.
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def set_rate(self, rate):
+        with self._lock:
+            self.rate = rate
+
+    def block_for(self, seconds):
+        """
+        No tokens are handed out for the given number of seconds.
+        """
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def blocked_for(self):
+        """
+        Returns the number of seconds left until tokens are handed out again.
+        """
+        with self._lock:
+            return max(0, self._blocked_until - time.monotonic())
+
+
+class Quota(object):
+    """
+    Attributes
+    ----------
+    limit : int
+    remaining : int
+    reset : float
+        Epoch time at which the quota is reset
+    """
+
+    def __init__(self, limit=None, remaining=None, reset=None):
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = reset
+
+    def __repr__(self):
+        return pv([
+            'limit', self.limit,
+            'remaining', self.remaining,
+            'reset', self.reset])
+
+
+class RateLimiter(object):
+    """
+    Paces requests for each endpoint ('search', 'abstract', 'article').
+
+    Requests are sent at the configured rate until the server reports that
+    the quota is used up, after which they are held until the quota resets.
+    If that is more than max_block seconds away, RateLimitError is raised
+    instead, so that a job doesn't silently sleep for days.
+    """
+
+    def __init__(self, rates=None, spread_quota=False, max_block=300):
+        """
+        Parameters
+        ----------
+        rates : dict
+            Requests per second for each endpoint, these update
+            DEFAULT_RATES. A rate of None disables pacing for the endpoint.
+        spread_quota : bool
+            If True, the rate is also limited to the rate that would spread
+            the remaining quota evenly until it resets. This is useful for
+            long running jobs that share a key with other users.
+        max_block : float
+            Longest time in seconds that a request is held when the quota
+            is used up or the server asked us to wait. None for no limit.
+        """
+        self.spread_quota = spread_quota
+        self.max_block = max_block
+        self.rates = dict(DEFAULT_RATES)
+        if rates is not None:
+            self.rates.update(rates)
+
+        self._buckets = {}
+        for endpoint, rate in self.rates.items():
+            if rate is not None:
+                self._buckets[endpoint] = TokenBucket(rate)
+
+        self._quotas = {}
+
+    def reserve(self, endpoint):
+        """
+        Returns how long to wait before making a request to the endpoint.
+
+        Raises
+        ------
+        RateLimitError
+            If requests are held for longer than max_block
+        """
+        bucket = self._buckets.get(endpoint)
+        if bucket is None:
+            return 0
+
+        blocked_for = bucket.blocked_for()
+        if self.max_block is not None and blocked_for > self.max_block:
+            raise RateLimitError('Scopus %s requests are blocked for %0.0f more seconds'
+                                 % (endpoint, blocked_for), retry_after=blocked_for)
+        return bucket.reserve()
+
+    def acquire(self, endpoint):
+        wait = self.reserve(endpoint)
+        if wait > 0:
+            time.sleep(wait)
+
+    def update_from_headers(self, endpoint, headers):
+        """
+        Records the quota sent back by the server, holding requests to the
+        endpoint if the quota is used up.
+        """
+        remaining = headers.get('X-RateLimit-Remaining')
+        if remaining is None:
+            return
+
+        limit = headers.get('X-RateLimit-Limit')
+        reset = headers.get('X-RateLimit-Reset')
+        quota = Quota(
+            limit=_to_number(limit, int),
+            remaining=_to_number(remaining, int),
+            reset=_to_number(reset, float))
+        self._quotas[endpoint] = quota
+
+        bucket = self._buckets.get(endpoint)
+        if bucket is None or quota.remaining is None or quota.reset is None:
+            return
+
+        time_left = quota.reset - time.time()
+        if time_left <= 0:
+            return
+        if quota.remaining <= 0:
+            bucket.block_for(time_left)
+        elif self.spread_quota:
+            bucket.set_rate(min(self.rates[endpoint], quota.remaining / time_left))
+
+    def rate(self, endpoint):
+        """
+        Returns the current requests per second for the endpoint, or None
+        if requests to the endpoint aren't paced.
+        """
+        bucket = self._buckets.get(endpoint)
+        if bucket is None:
+            return None
+        return bucket.rate
+
+    def block(self, endpoint, seconds):
+        """
+        Stops requests to the endpoint, e.g. after a 429 response.
+        """
+        bucket = self._buckets.get(endpoint)
+        if bucket is not None:
+            bucket.block_for(seconds)
+
+    def quota(self, endpoint):
+        """
+        Returns
+        -------
+        Quota or None
+            None if no response from the endpoint has reported a quota yet
+        """
+        return self._quotas.get(endpoint)
+
+
+def _to_number(value, type_):
+    if value is None:
+        return None
+    try:
+        return type_(value)
+    except ValueError:
+        return None
@@ -34,6 +34,13 @@ def get_list_class_display(value):
     """
     if value is None:
         return 'None'
+    elif hasattr(value, 'item_class'):
+        # Lazy sequences (e.g. models.LazyRefList) are shown without
+        # parsing their items
+        item_class = value.item_class
+        # item_class may be a functools.partial, see Scopus(compact_models=True)
+        name = getattr(item_class, '__name__', None) or item_class.func.__name__
+        return u'[%s] len(%d)' % (name, len(value))
     elif isinstance(value, list):
         # Check for 0 length
         try:
@@ -74,3 +81,38 @@ def refs_to_list(refs):
         ref_list.append(convert_to_dict(ref))
     return ref_list
 
+
+
+def get_json_decoder(backend=None):
+    """
+    Returns a function which decodes JSON from bytes or str.
+
+    Parameters
+    ----------
+    backend : str or callable
+        {'orjson', 'ujson', 'json'} or a decoding function. By default the
+        fastest installed backend is used: orjson, then ujson, then the
+        standard library.
+    """
+    if callable(backend):
+        return backend
+
+    if backend is None:
+        for name in ('orjson', 'ujson'):
+            try:
+                return get_json_decoder(name)
+            except ImportError:
+                pass
+        backend = 'json'
+
+    if backend == 'orjson':
+        import orjson
+        return orjson.loads
+    elif backend == 'ujson':
+        import ujson
+        return ujson.loads
+    elif backend == 'json':
+        import json
+        return json.loads
+    else:
+        raise ValueError('Unrecognized JSON backend: %s' % backend)